@@ -0,0 +1,123 @@
+"""Times each stage of physvis on synthetic studies of growing size, and saves the timings as .json
+
+e.g. python benchmarks/run.py --participants 5,20,80 --output benchmarks.json
+"""
+from pathlib import Path
+from datetime import datetime, timezone
+import contextlib
+import inspect
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import click
+
+# benchmark the physvis of this repository, rather than an installed one
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+import numpy as np
+import pandas as pd
+
+from physvis import __version__, helpers, interactions, maths
+from physvis.dataset import Dataset
+from startup import commands, startup_time
+from synthetic import generate_study
+
+
+def _timed(function, repeat: int = 1) -> tuple:
+    # the fastest wall time of a number of runs, and the result of the last run, hiding what it prints
+    best, result = None, None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def run_study(root: Path, participants: int, physicalisations: int, cubes: int, clusters: int, repeat: int, figures: int) -> list:
+    """Generates one synthetic study in root, and times each stage on it
+    Returns:
+        A list of results, each a dictionary with the 'stage', the size of the study and the 'seconds' it took
+    """
+    files = generate_study(root / 'input', participants=participants, physicalisations=physicalisations, cubes=cubes, clusters=clusters)
+    size = {'participants': participants, 'physicalisations': physicalisations, 'cubes': cubes, 'clusters': clusters, 'files': len(files),
+            # collect() fills in the missing cubes, so each file becomes a row per cube
+            'rows': len(files) * cubes}
+    results = []
+
+    def record(stage, function, times=repeat):
+        seconds, result = _timed(function, times)
+        results.append(dict(stage=stage, seconds=round(seconds, 6), **size))
+        click.echo(f"  {stage:<40} {seconds:10.4f}s")
+        return result
+
+    # the calculations save their results in 'output', relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        record('collect', lambda: interactions.generate_large_csv('input', 'output', save=True, incremental=False))
+        combined = 'output/combined.csv'
+        record('get_large_csv (csv)', lambda: helpers.get_large_csv(combined, cache=False))
+        frame = record('get_large_csv (cache)', lambda: helpers.get_large_csv(combined))
+        record('get_collected (store)', lambda: helpers.get_collected(combined))
+        record('get_collected (1 physicalisation)', lambda: helpers.get_collected(combined, physicalisation=[frame.index.levels[1][0]]))
+        dataset = record('Dataset.from_frame', lambda: Dataset.from_frame(frame))
+        trials = dataset.trials()
+        record(f"Dataset.trial (x{len(trials)})", lambda: [dataset.trial(*trial).conditions([0, 2]).frame() for trial in trials])
+
+        for name, function in inspect.getmembers(maths, inspect.isfunction):
+            if name.startswith('_') or function.__module__ != maths.__name__:
+                continue
+            record(f"maths.{name}", lambda: function(dataset))
+
+        # the construction of the figures printvis() exports, without exporting them
+        tasks = [{'phys': phys, 'part': part, 'view': view, 'cond': [0, 2]} for phys, part, view in trials[:figures]]
+        record(f"printvis figures (x{len(tasks)})", lambda: [interactions.task_figure(dataset, task) for task in tasks])
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+@click.command()
+@click.option("--participants", "-p", default="5,20", help="The sizes of the studies to time, as a comma separated number of participants. Default is '5,20'")
+@click.option("--physicalisations", default=6, help="The number of physicalisations in each study. Default is 6")
+@click.option("--cubes", default=16, help="The number of cubes in each physicalisation. Default is 16")
+@click.option("--clusters", default=5, help="The number of clusters cubes are grouped in. Default is 5")
+@click.option("--repeat", "-r", default=3, help="The number of runs of each stage, of which the fastest is kept. Default is 3")
+@click.option("--figures", default=20, help="The number of figures to construct. Default is 20")
+@click.option("--output", "-o", default="benchmarks.json", help="The .json file to save the results to. Default is 'benchmarks.json'")
+def main(participants: str, physicalisations: int, cubes: int, clusters: int, repeat: int, figures: int, output: str) -> None:
+    results = []
+    click.echo("\nstartup")
+    for args in commands:
+        stage = f"startup: phys {' '.join(args)}"
+        seconds = startup_time(args, repeat)
+        results.append({'stage': stage, 'seconds': round(seconds, 6)})
+        click.echo(f"  {stage:<40} {seconds:10.4f}s")
+
+    for count in [int(x) for x in participants.split(',')]:
+        click.echo(f"\n{count} participants, {physicalisations} physicalisations, {cubes} cubes, {clusters} clusters")
+        with tempfile.TemporaryDirectory() as root:
+            results += run_study(Path(root), count, physicalisations, cubes, clusters, repeat, figures)
+
+    report = {
+        'physvis': __version__,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'results': results,
+    }
+    Path(output).write_text(json.dumps(report, indent=2))
+    click.echo(f"\nSaved the results to {output}")
+
+
+if __name__ == '__main__':
+    main()
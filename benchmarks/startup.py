@@ -0,0 +1,67 @@
+"""Checks that the phys command starts within a time budget, without importing pandas, numpy or plotly
+
+e.g. python benchmarks/startup.py --budget 0.3
+"""
+from pathlib import Path
+import os
+import subprocess
+import sys
+import time
+
+import click
+
+# the modules no command should import before it runs
+heavy_modules = ['pandas', 'numpy', 'plotly', 'tqdm']
+
+# the commands to time, as arguments of phys
+commands = [['--help'], ['collect', '--help'], ['calc', '--help'], ['print', '--help']]
+
+
+def _run(code: str, args: list = []) -> subprocess.CompletedProcess:
+    # run python code in a new process, using the physvis of this repository
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([str(Path(__file__).resolve().parents[1] / 'src'), env.get('PYTHONPATH', '')])
+    return subprocess.run([sys.executable, '-c', code, *args], env=env, capture_output=True, text=True, check=True)
+
+
+def startup_time(args: list, repeat: int = 5) -> float:
+    """The fastest wall time of running phys with these arguments, in a new process"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _run("import sys; sys.argv[0] = 'phys'; from physvis.console import main; main()", args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def imported_heavy_modules() -> list:
+    """The heavy modules imported by loading the phys command"""
+    result = _run("import sys; import physvis.console; print(' '.join(sorted({m.split('.')[0] for m in sys.modules})))")
+    return [module for module in heavy_modules if module in result.stdout.split()]
+
+
+@click.command()
+@click.option("--budget", "-b", default=.3, help="The maximum seconds each command may take to start. Default is 0.3")
+@click.option("--repeat", "-r", default=5, help="The number of runs of each command, of which the fastest is kept. Default is 5")
+def main(budget: float, repeat: int) -> None:
+    failed = False
+
+    heavy = imported_heavy_modules()
+    if heavy:
+        click.echo(f"phys imports {', '.join(heavy)} when it starts")
+        failed = True
+
+    for args in commands:
+        seconds = startup_time(args, repeat)
+        over = seconds > budget
+        failed |= over
+        click.echo(f"  phys {' '.join(args):<20} {seconds:8.3f}s{'  over budget' if over else ''}")
+
+    if failed:
+        sys.exit(1)
+    click.echo(f"All commands start within {budget}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Generates a synthetic study, in the .csv files collect() expects
+
+e.g. python benchmarks/synthetic.py input --participants 20 --physicalisations 6 --cubes 16 --clusters 5
+"""
+from pathlib import Path
+import random
+
+import click
+
+
+def generate_study(output: str, participants: int = 20, physicalisations: int = 6, cubes: int = 16, clusters: int = 5,
+                   orientations: str = 'NESW', conditions: int = 3, missing: float = .01, seed: int = 0) -> list:
+    """Writes one P<n>_<phys>_<orient>_<cond>.csv file per trial and condition
+    Each trial starts from random cubes on a 20x20 grid, of which some are turned, moved or regrouped in every
+    next condition, like participants would do.
+    Args:
+        output: the folder to write the files to
+        participants, physicalisations, cubes, clusters: the size of the study
+        orientations: the orientations each physicalisation is viewed from
+        conditions: the number of conditions of each trial
+        missing: the chance a cube is left out of a condition after the first
+        seed: the seed of the random numbers, so the same arguments always give the same study
+    Returns:
+        A list of the files written
+    """
+    rnd = random.Random(seed)
+    path = Path(output)
+    path.mkdir(parents=True, exist_ok=True)
+
+    files = []
+    for participant in range(1, participants + 1):
+        for phys in range(1, physicalisations + 1):
+            for orientation in orientations:
+                grid = rnd.sample(range(400), cubes)
+                state = [[cube, rnd.randint(1, 4), rnd.choice('xyz'), rnd.randint(1, clusters), 1 + cell // 20, 1 + cell % 20]
+                         for cube, cell in enumerate(grid, 1)]
+
+                for condition in range(conditions):
+                    if condition:
+                        for cube in state:
+                            change = rnd.random()
+                            if change < .15:
+                                cube[2] = rnd.choice('xyz')
+                            elif change < .3:
+                                cube[4], cube[5] = rnd.randint(1, 20), rnd.randint(1, 20)
+                            elif change < .35:
+                                cube[3] = rnd.randint(1, clusters)
+
+                    rows = ["cube;h;o;g;coordinates;"]
+                    for cube, h, o, g, x, y in state:
+                        if condition and rnd.random() < missing:
+                            continue
+                        rows.append(f"{cube};{h};{o};{g};{x},{y};")
+
+                    filename = path / f"P{participant}_{phys}_{orientation}_{condition}.csv"
+                    filename.write_text("\n".join(rows) + "\n")
+                    files.append(filename)
+    return files
+
+
+@click.command()
+@click.argument("output")
+@click.option("--participants", "-p", default=20, help="The number of participants. Default is 20")
+@click.option("--physicalisations", default=6, help="The number of physicalisations. Default is 6")
+@click.option("--cubes", default=16, help="The number of cubes in each physicalisation. Default is 16")
+@click.option("--clusters", default=5, help="The number of clusters cubes are grouped in. Default is 5")
+@click.option("--seed", default=0, help="The seed of the random numbers. Default is 0")
+def main(output: str, participants: int, physicalisations: int, cubes: int, clusters: int, seed: int) -> None:
+    files = generate_study(output, participants=participants, physicalisations=physicalisations, cubes=cubes, clusters=clusters, seed=seed)
+    click.echo(f"Wrote {len(files)} files to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,9 @@
 __version__ = "0.1.0"
+
+
+def __getattr__(name):
+    # Dataset needs pandas and numpy, so it is only imported when used, e.g. physvis.Dataset.from_csv(...)
+    if name == 'Dataset':
+        from .dataset import Dataset
+        return Dataset
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
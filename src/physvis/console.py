@@ -1,33 +1,81 @@
 import click
-import inspect
+import functools
+from pathlib import Path
 
 from . import __version__
-from . import interactions
-from . import helpers
-from . import maths
+from . import profiling
 
-@click.command()
-@click.version_option(version=__version__)
-@click.option("--input", "-i", default="output/combined.csv", help="The location of the large .csv file compiled by collect(). Default is 'output/combined.csv'")
-def main(input: str, output: str, delimiter: str, save: bool) -> None:
+# pandas, numpy and plotly take a while to import, so each command imports only what it uses, when it runs
 
-    click.echo(f"Press 'control+c' to abort this program at any point.\n")
+# the default lists of images to print
+tasks_folder = Path(__file__).parent / 'tasks'
+
+
+def profile_option(command):
+    # adds --profile (and --profile-output) to a command, recording the time and memory of each stage it runs
+    @click.option("--profile", is_flag=True, help="Print the time, number of calls and peak memory of each stage afterwards")
+    @click.option("--profile-output", default=None, help="Save the profile to this file, as .json, or as a cProfile for a .prof file")
+    @functools.wraps(command)
+    def wrapper(*args, profile: bool, profile_output: str, **kwargs):
+        if not (profile or profile_output):
+            return command(*args, **kwargs)
+        with profiling.profile(profile_output):
+            return command(*args, **kwargs)
+    return wrapper
+
+
+def filter_options(command):
+    # adds the filters of helpers.get_collected() to a command, passed on as 'store' and a dict of 'filters'
+    @click.option("--study", multiple=True, help="Only load this study from the store written by collect (needed if it holds several)")
+    @click.option("--phys", "physicalisation", multiple=True, help="Only load this physicalisation (repeat for more)")
+    @click.option("--participant", multiple=True, help="Only load this participant (repeat for more)")
+    @click.option("--orientation", multiple=True, help="Only load this orientation (repeat for more)")
+    @click.option("--store", default=None, help="The folder of the store written by collect. Default is the 'store' next to the --input .csv")
+    @functools.wraps(command)
+    def wrapper(*args, study: tuple, physicalisation: tuple, participant: tuple, orientation: tuple, store: str, **kwargs):
+        filters = {'study': list(study), 'physicalisation': list(physicalisation), 'participant': list(participant), 'orientation': list(orientation)}
+        return command(*args, store=store, filters=filters, **kwargs)
+    return wrapper
+
+
+def load_collected(input: str, delimiter: str, store: str, filters: dict):
+    # the data of helpers.get_collected(), of one study only, as the visualisations and calculations compare its participants
+    from . import helpers
 
-    click.echo(f"Collecting .csv files from {input}")
-    interactions.collect(input, output, delimiter, save = True)
-    click.echo("Done.")
+    frame = helpers.get_collected(input, delimiter, store=store, **filters)
+    if 'study' in frame.index.names:
+        studies = ", ".join(f"'{study}'" for study in frame.index.unique('study'))
+        raise click.UsageError(f"The store holds several studies ({studies}), select one with --study")
+    return frame
 
 
 @click.command()
 @click.option("--delimiter", "-d", default=";", help="Delimiter used in your csv files. Default is ';'")
 @click.option("--input", "-i", default="output/combined.csv", help="The location of the large .csv file compiled by collect(). Default is 'output/combined.csv'")
-def vis(input: str, delimiter: str) -> None:
+@click.option("--serve", is_flag=True, help="Browse all trials on a local web page, rather than opening each one in a new tab")
+@click.option("--port", "-p", default=8050, help="The port of the local web page of --serve. Default is 8050")
+@filter_options
+@profile_option
+def vis(input: str, delimiter: str, serve: bool, port: int, store: str, filters: dict) -> None:
+    """Select one trial, and visualise it in 3D in the browser"""
+    from . import interactions
+    from .dataset import Dataset
+
     click.echo(f"Press 'control+c' to abort this program at any point.\n")
 
-    click.echo(f"\nWhich situation do you want to visualise?")
-    frame = helpers.get_large_csv(input, delimiter)
+    frame = load_collected(input, delimiter, store, filters)
     # print(frame.info())
 
+    # arrange the frame into arrays once, shared by all visualisations
+    dataset = Dataset.from_frame(frame)
+
+    if serve:
+        from . import server
+        server.serve(dataset, port=port)
+        return
+
+    click.echo(f"\nWhich situation do you want to visualise?")
+
     repeat = True
 
     while repeat:
@@ -42,10 +90,10 @@ def vis(input: str, delimiter: str) -> None:
         # display result, or err
         try:
             click.echo(f"\nI found this situation:\n")
-            interactions.display(frame, participant, condition, orientation, physicalisation)
+            interactions.display(dataset, participant, condition, orientation, physicalisation)
             click.echo(f"\nThe visualisation should now open in the browser\n")
         except Exception as e:
-            print(f"An error occured in visualising Phys {physicalisation}, for P{participant}_{condition}_{orientation}: {e}")
+            click.echo(f"An error occured in visualising Phys {physicalisation}, for P{participant}_{condition}_{orientation}: {e}")
 
         # possibly visualise another one
         if click.confirm('Would you like to visualise another one?'):
@@ -57,34 +105,27 @@ def vis(input: str, delimiter: str) -> None:
 @click.command()
 @click.option("--delimiter", "-d", default=";", help="Delimiter used in your csv files. Default is ';'")
 @click.option("--input", "-i", default="output/combined.csv", help="The location of the large .csv file compiled by collect(). Default is 'output/combined.csv'")
-def printheat(input: str, delimiter: str) -> None:
+@click.option("--jobs", "-j", default=1, type=click.IntRange(min=1), help="The number of processes rendering images in parallel. Default is 1")
+@click.option("--force", is_flag=True, help="Export all images again, also those of which the data and settings have not changed")
+@click.option("--tasks", "-t", default=str(tasks_folder / "heatmap.csv"), help="A .csv file listing the images to print. Default is the list in physvis/tasks/heatmap.csv")
+@filter_options
+@profile_option
+def printheat(input: str, delimiter: str, jobs: int, force: bool, tasks: str, store: str, filters: dict) -> None:
+    """Export 3D renderings of trials coloured by heatmap data, as .jpg"""
+    from . import helpers, interactions
+    from .dataset import Dataset
+
     click.echo(f"Press 'control+c' to abort this program at any point.\n")
 
-    frame = helpers.get_large_csv(input, delimiter)
+    frame = load_collected(input, delimiter, store, filters)
     data = [
         helpers.get_heatmap_csv("output/IDs_changed_0-1.csv", delimiter = delimiter),
         helpers.get_heatmap_csv("output/IDs_changed_0-2.csv", delimiter = delimiter),
         ]
 
-    # TODO: store this variable in a .csv file 
-    to_print = [
-        {'phys': 1, 'part': 1, 'view': 'N', 'cond': [0], 'data': 1 },
-        {'phys': 2, 'part': 1, 'view': 'N', 'cond': [0], 'data': 1 },
-        {'phys': 3, 'part': 1, 'view': 'N', 'cond': [0], 'data': 1 },
-        {'phys': 4, 'part': 1, 'view': 'N', 'cond': [0], 'data': 1 },
-        {'phys': 5, 'part': 1, 'view': 'N', 'cond': [0], 'data': 1 },
-        {'phys': 6, 'part': 1, 'view': 'N', 'cond': [0], 'data': 1 },
-
-        {'phys': 1, 'part': 1, 'view': 'N', 'cond': [0], 'data': 2 },
-        {'phys': 2, 'part': 1, 'view': 'N', 'cond': [0], 'data': 2 },
-        {'phys': 3, 'part': 1, 'view': 'N', 'cond': [0], 'data': 2 },
-        {'phys': 4, 'part': 1, 'view': 'N', 'cond': [0], 'data': 2 },
-        {'phys': 5, 'part': 1, 'view': 'N', 'cond': [0], 'data': 2 },
-        {'phys': 6, 'part': 1, 'view': 'N', 'cond': [0], 'data': 2 },
-    ]
-
+    to_print = helpers.select_tasks(helpers.get_tasks_csv(tasks), frame)
 
-    interactions.printvis(frame=frame, tasks=to_print, data=data)
+    interactions.printvis(frame=Dataset.from_frame(frame), tasks=to_print, data=data, jobs=jobs, cache=not force)
 
     click.echo(f"\nTill next time!\n")
 
@@ -92,96 +133,43 @@ def printheat(input: str, delimiter: str) -> None:
 @click.command()
 @click.option("--delimiter", "-d", default=";", help="Delimiter used in your csv files. Default is ';'")
 @click.option("--input", "-i", default="output/combined.csv", help="The location of the large .csv file compiled by collect(). Default is 'output/combined.csv'")
-def print(input: str, delimiter: str) -> None:
+@click.option("--jobs", "-j", default=1, type=click.IntRange(min=1), help="The number of processes rendering images in parallel. Default is 1")
+@click.option("--force", is_flag=True, help="Export all images again, also those of which the data and settings have not changed")
+@click.option("--tasks", "-t", default=str(tasks_folder / "print.csv"), help="A .csv file listing the images to print. Default is the list in physvis/tasks/print.csv")
+@filter_options
+@profile_option
+def print(input: str, delimiter: str, jobs: int, force: bool, tasks: str, store: str, filters: dict) -> None:
+    """Export 3D renderings of a list of trials, as .jpg"""
+    from . import helpers, interactions
+    from .dataset import Dataset
+
     click.echo(f"Press 'control+c' to abort this program at any point.\n")
 
-    frame = helpers.get_large_csv(input, delimiter)
-
-    # TODO: store this variable in a .csv file
-    to_print = [
-        {'phys': 1, 'part': 1, 'view': 'N', 'cond': [0], 'baseline': True },
-        {'phys': 2, 'part': 1, 'view': 'N', 'cond': [0], 'baseline': True },
-        {'phys': 3, 'part': 1, 'view': 'N', 'cond': [0], 'baseline': True },
-        {'phys': 4, 'part': 1, 'view': 'N', 'cond': [0], 'baseline': True },
-        {'phys': 5, 'part': 1, 'view': 'N', 'cond': [0], 'baseline': True },
-        {'phys': 6, 'part': 1, 'view': 'N', 'cond': [0], 'baseline': True },
-
-        {'phys': 1, 'part': 1, 'view': 'N', 'cond': [0] },
-        {'phys': 1, 'part': 8, 'view': 'N', 'cond': [0] },
-        {'phys': 1, 'part': 16, 'view': 'N', 'cond': [0] },
-        {'phys': 1, 'part': 8, 'view': 'N', 'cond': [0,2] },
-        {'phys': 1, 'part': 8, 'view': 'E', 'cond': [0,2] },
-        {'phys': 1, 'part': 8, 'view': 'S', 'cond': [0,2] },
-        {'phys': 1, 'part': 8, 'view': 'W', 'cond': [0,2] },
-        {'phys': 1, 'part': 11, 'view': 'N', 'cond': [0,2] },
-        {'phys': 1, 'part': 16, 'view': 'N', 'cond': [0,2] },
-        {'phys': 1, 'part': 4, 'view': 'E', 'cond': [0,2] },
-        {'phys': 1, 'part': 19, 'view': 'N', 'cond': [0,1] },
-        {'phys': 1, 'part': 19, 'view': 'N', 'cond': [0,2] },
-
-        {'phys': 2, 'part': 1, 'view': 'N', 'cond': [0] },
-        {'phys': 2, 'part': 2, 'view': 'N', 'cond': [0] },
-        {'phys': 2, 'part': 11, 'view': 'E', 'cond': [0,2] },
-        {'phys': 2, 'part': 9, 'view': 'E', 'cond': [0,2] },
-        {'phys': 2, 'part': 2, 'view': 'N', 'cond': [0,2] },
-        {'phys': 2, 'part': 13, 'view': 'S', 'cond': [0,1] },
-        {'phys': 2, 'part': 7, 'view': 'N', 'cond': [0,2] },
-        {'phys': 2, 'part': 15, 'view': 'S', 'cond': [0,2] },
-        {'phys': 2, 'part': 4, 'view': 'E', 'cond': [0,2] },
-
-        {'phys': 3, 'part': 4, 'view': 'N', 'cond': [0] },
-        {'phys': 3, 'part': 14, 'view': 'N', 'cond': [0] },
-        {'phys': 3, 'part': 1, 'view': 'N', 'cond': [0] },
-        {'phys': 3, 'part': 1, 'view': 'N', 'cond': [0] },
-        {'phys': 3, 'part': 14, 'view': 'E', 'cond': [0,1] },
-        {'phys': 3, 'part': 14, 'view': 'E', 'cond': [0,2] },
-        {'phys': 3, 'part': 1, 'view': 'N', 'cond': [0,2] },
-        {'phys': 3, 'part': 7, 'view': 'E', 'cond': [0,2] },
-        {'phys': 3, 'part': 8, 'view': 'E', 'cond': [0,2] },
-        {'phys': 3, 'part': 12, 'view': 'N', 'cond': [0,1] },
-        {'phys': 3, 'part': 12, 'view': 'N', 'cond': [0,2] },
-        {'phys': 3, 'part': 7, 'view': 'E', 'cond': [0] },
-        {'phys': 3, 'part': 10, 'view': 'E', 'cond': [0] },
-
-        {'phys': 4, 'part': 4, 'view': 'N', 'cond': [0] },
-        {'phys': 4, 'part': 1, 'view': 'N', 'cond': [0] },
-        {'phys': 4, 'part': 3, 'view': 'N', 'cond': [0] },
-        {'phys': 4, 'part': 2, 'view': 'N', 'cond': [0] },
-        {'phys': 4, 'part': 5, 'view': 'N', 'cond': [0,1] },
-        {'phys': 4, 'part': 16, 'view': 'S', 'cond': [0,1] },
-        {'phys': 4, 'part': 3, 'view': 'N', 'cond': [0,1] },
-        {'phys': 4, 'part': 6, 'view': 'N', 'cond': [0,1] },
-        {'phys': 4, 'part': 10, 'view': 'N', 'cond': [0,1] },
-        {'phys': 4, 'part': 17, 'view': 'N', 'cond': [0,2] },
-
-        {'phys': 5, 'part': 1, 'view': 'N', 'cond': [0] },
-        {'phys': 5, 'part': 8, 'view': 'N', 'cond': [0,1] },
-        {'phys': 5, 'part': 8, 'view': 'N', 'cond': [0,2] },
-        {'phys': 5, 'part': 14, 'view': 'N', 'cond': [0,2] },
-        {'phys': 5, 'part': 6, 'view': 'E', 'cond': [0,2] },
-        {'phys': 5, 'part': 6, 'view': 'E', 'cond': [0] },
-
-        {'phys': 6, 'part': 1, 'view': 'N', 'cond': [0] },
-        {'phys': 6, 'part': 7, 'view': 'N', 'cond': [0] },
-        {'phys': 6, 'part': 3, 'view': 'N', 'cond': [0,2] },
-        {'phys': 6, 'part': 4, 'view': 'S', 'cond': [0,2] },
-        {'phys': 6, 'part': 8, 'view': 'W', 'cond': [0,2] },
-        {'phys': 6, 'part': 14, 'view': 'S', 'cond': [0,1] },
-        {'phys': 6, 'part': 9, 'view': 'N', 'cond': [0,1] },
-        {'phys': 6, 'part': 15, 'view': 'N', 'cond': [0,2] },
-        {'phys': 6, 'part': 7, 'view': 'E', 'cond': [0,2] },
-        {'phys': 6, 'part': 2, 'view': 'S', 'cond': [0,2] },
-        {'phys': 6, 'part': 7, 'view': 'S', 'cond': [0,2] },
-        {'phys': 6, 'part': 15, 'view': 'S', 'cond': [0,2] },
-        {'phys': 6, 'part': 5, 'view': 'N', 'cond': [0,1] },
-        {'phys': 6, 'part': 15, 'view': 'N', 'cond': [0,1] },
-        {'phys': 6, 'part': 15, 'view': 'N', 'cond': [0,2] },
-        {'phys': 6, 'part': 11, 'view': 'N', 'cond': [0,1] },
-        {'phys': 6, 'part': 16, 'view': 'W', 'cond': [0,1] },
-        {'phys': 6, 'part': 16, 'view': 'W', 'cond': [0,2] },
-    ]
-
-    interactions.printvis(frame=frame, tasks=to_print)
+    frame = load_collected(input, delimiter, store, filters)
+
+    to_print = helpers.select_tasks(helpers.get_tasks_csv(tasks), frame)
+
+    interactions.printvis(frame=Dataset.from_frame(frame), tasks=to_print, jobs=jobs, cache=not force)
+
+    click.echo(f"\nTill next time!\n")
+
+
+@click.command()
+@click.option("--delimiter", "-d", default=";", help="Delimiter used in your csv files. Default is ';'")
+@click.option("--input", "-i", default="output/combined.csv", help="The location of the large .csv file compiled by collect(). Default is 'output/combined.csv'")
+@click.option("--output", "-o", default="html", help="The folder to export to. Default is 'html'")
+@click.option("--format", "-f", "format_", default="html", type=click.Choice(['html', 'json']), help="Export pages (html), or only their figures (json). Default is 'html'")
+@click.option("--jobs", "-j", default=1, type=click.IntRange(min=1), help="The number of processes exporting pages in parallel. Default is 1")
+@click.option("--force", is_flag=True, help="Export all pages again, also those of which the data and settings have not changed")
+@filter_options
+@profile_option
+def export(input: str, delimiter: str, output: str, format_: str, jobs: int, force: bool, store: str, filters: dict) -> None:
+    """Export the 3D rendering of every trial as .html (or .json), with an index page"""
+    from . import interactions
+    from .dataset import Dataset
+
+    frame = load_collected(input, delimiter, store, filters)
+    interactions.exportvis(Dataset.from_frame(frame), output=output, format=format_, jobs=jobs, cache=not force)
 
     click.echo(f"\nTill next time!\n")
 
@@ -189,31 +177,54 @@ def print(input: str, delimiter: str) -> None:
 @click.command()
 @click.option("--delimiter", "-d", default=";", help="Delimiter used in your csv files. Default is ';'")
 @click.option("--input", "-i", default="input", help="The input location of the .csv files. Default is 'input'")
-def collect(input: str, delimiter: str) -> None:
+@click.option("--jobs", "-j", default=1, type=click.IntRange(min=1), help="The number of processes reading the .csv files in parallel. Default is 1")
+@click.option("--full", is_flag=True, help="Read all .csv files again, rather than only those added or changed since the previous collect")
+@click.option("--chunk-size", default=None, type=click.IntRange(min=1), help="Stream the .csv files in chunks of this many files, to limit the memory used (always reads all files)")
+@click.option("--study", default=None, help="The name to store the study under, in output/store. Default is the name of the --input folder")
+@profile_option
+def collect(input: str, delimiter: str, jobs: int, full: bool, chunk_size: int, study: str) -> None:
+    """Collect the .csv files of all trials into one .csv"""
+    from . import interactions
+
     click.echo(f"Press 'control+c' to abort this program at any point.\n")
 
     click.echo(f"Collecting Data from {input}")
-    frame = interactions.generate_large_csv(input = input, output = 'output', delimiter = delimiter, save = True)
+    frame = interactions.generate_large_csv(input = input, output = 'output', delimiter = delimiter, save = True, jobs = jobs, incremental = not full, chunk_size = chunk_size, study = study)
     click.echo(f"See the output/combined.csv for the combined result")
 
 
 @click.command()
 @click.option("--delimiter", "-d", default=";", help="Delimiter used in your csv files. Default is ';'")
 @click.option("--input", "-i", default="output/combined.csv", help="The location of the large .csv file compiled by collect(). Default is 'output/combined.csv'")
-def calc(input: str, delimiter: str) -> None:
+@click.option("--bootstrap", "-b", default=0, type=click.IntRange(min=0), help="Add 95% confidence intervals to the results per physicalisation, by resampling the participants this many times, e.g. 10000. Default is 0 (none)")
+@click.option("--permutations", "-n", default=0, type=click.IntRange(min=0), help="Save the p-values of the differences between phases and physicalisations, from this many permutations, e.g. 100000, to a separate _pvalues.csv. Default is 0 (none)")
+@click.option("--seed", default=0, help="The seed of the resampling of --bootstrap and --permutations. Default is 0")
+@click.option("--jobs", "-j", default=1, type=click.IntRange(min=1), help="The number of processes resampling in parallel. Default is 1")
+@filter_options
+@profile_option
+def calc(input: str, delimiter: str, bootstrap: int, permutations: int, seed: int, jobs: int, store: str, filters: dict) -> None:
+    """Run calculations on the collected .csv"""
+    import inspect
+    from . import maths
+    from .dataset import Dataset
+
     click.echo(f"Press 'control+c' to abort this program at any point.")
 
     click.echo(f"\nWhich calculation do you want to perform?\n")
-    frame = helpers.get_large_csv(input, delimiter)
+    frame = load_collected(input, delimiter, store, filters)
     # print(frame.info())
 
+    # arrange the frame into arrays once, shared by all calculations
+    dataset = Dataset.from_frame(frame)
+
     repeat = True
 
     while repeat:
         repeat = False
 
         # get user input
-        possible_functions = [x[0] for x in inspect.getmembers(maths, inspect.isfunction)]
+        possible_functions = [name for name, function in inspect.getmembers(maths, inspect.isfunction)
+                              if not name.startswith('_') and function.__module__ == maths.__name__]
         possible_functions.reverse()
         show_options = [str(i) + '. ' + x for i, x in enumerate(possible_functions, 1)]
         click.echo("\n".join(show_options) + "\n")
@@ -225,13 +236,16 @@ def calc(input: str, delimiter: str) -> None:
         try:
             click.echo(f"\nRunning '{chosen_function}':\n")
 
-            # run the chosen method, with options: getattr(maths, chosen_function)(**options)
-            result = getattr(maths, chosen_function)(frame)
+            # run the chosen method, with the options it takes
+            function = getattr(maths, chosen_function)
+            options = {name: value for name, value in [('bootstrap', bootstrap), ('permutations', permutations), ('seed', seed), ('jobs', jobs)]
+                       if name in inspect.signature(function).parameters}
+            result = function(dataset, **options)
             click.echo(result)
 
             click.echo(f"\nFinished calculation.\n")
         except Exception as e:
-            print(f"An error occured in the {chosen_function} calculation: {e}")
+            click.echo(f"An error occured in the {chosen_function} calculation: {e}")
 
         # possibly visualise another one
         repeat = False
@@ -240,3 +254,17 @@ def calc(input: str, delimiter: str) -> None:
 
 
     click.echo(f"\nTill next time!\n")
+
+
+@click.group()
+@click.version_option(version=__version__)
+def main() -> None:
+    """Reconstruct, visualise and analyse data from physicalisations"""
+
+
+main.add_command(vis)
+main.add_command(collect)
+main.add_command(calc)
+main.add_command(print)
+main.add_command(printheat, name='heatmap')
+main.add_command(export)
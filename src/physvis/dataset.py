@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+
+
+class Dataset:
+    """Dense arrays of all trials, built once from the frame returned by get_large_csv()
+    Every array is indexed by (physicalisation, participant, orientation, condition, cube), so calculations
+    and renderings can take any trial, condition or cube without grouping the frame again.
+    The rows of each trial and condition in the frame are indexed too, see trial()
+    Attributes:
+        levels: the values along each axis, e.g. levels['orientation'] = Index(['E', 'N', 'S', 'W'])
+        h, g, x, y: float arrays, NaN where a cube is missing
+        o: an object array of orientations ('x', 'y' or 'z'), NaN where the frame holds no row
+        present: a boolean array, True where the frame holds a row
+        frame: the frame the arrays were built from (if any), with the rows of each trial in one block
+    """
+
+    axes = ['physicalisation', 'participant', 'orientation', 'condition', 'cube']
+    columns = ['h', 'o', 'g', 'x', 'y']
+
+    def __init__(self, levels: dict, arrays: dict, present: np.ndarray, index_names: list = None, frame: pd.DataFrame = None, rows: tuple = None):
+        self.levels = levels
+        self.present = present
+        for column in self.columns:
+            setattr(self, column, arrays[column])
+        # the order of the index of the original frame, used to give selections the same layout
+        self.index_names = index_names if index_names is not None else list(self.axes)
+        self.frame = frame
+        # the first and last (exclusive) row in the frame of each (physicalisation, participant, orientation, condition)
+        self._starts, self._stops = rows if rows is not None else (None, None)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> 'Dataset':
+        """Builds the arrays from a frame with a (participant, physicalisation, orientation, condition, cube) index
+        Args:
+            frame: the data frame, as returned by get_large_csv()
+        Returns:
+            A Dataset
+        """
+        index = frame.index.remove_unused_levels()
+        names = list(index.names)
+        levels = {name: index.levels[names.index(name)] for name in cls.axes}
+        codes = tuple(index.codes[names.index(name)] for name in cls.axes)
+        shape = tuple(len(level) for level in levels.values())
+
+        # each condition of each trial should be one block of rows, as in the sorted frames of collect()
+        keys = np.ravel_multi_index(codes[:4], shape[:4])
+        if len(keys) and (np.count_nonzero(np.diff(keys)) + 1) != len(np.unique(keys)):
+            order = np.argsort(np.ravel_multi_index(codes, shape), kind='stable')
+            frame, keys = frame.take(order), keys[order]
+            codes = tuple(axis_codes[order] for axis_codes in codes)
+
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        first, last = np.r_[0, boundaries], np.r_[boundaries, len(keys)]
+        starts, stops = np.zeros(shape[:4], dtype=np.int64), np.zeros(shape[:4], dtype=np.int64)
+        if len(keys):
+            starts.flat[keys[first]], stops.flat[keys[first]] = first, last
+
+        arrays = {}
+        for column in cls.columns:
+            if pd.api.types.is_numeric_dtype(frame[column]):
+                values = frame[column].to_numpy(dtype=float, na_value=np.nan)
+            else:
+                values = frame[column].to_numpy()
+            array = np.full(shape, np.nan, dtype=object if values.dtype == object else float)
+            array[codes] = values
+            arrays[column] = array
+
+        present = np.zeros(shape, dtype=bool)
+        present[codes] = True
+        return cls(levels, arrays, present, index_names=names, frame=frame, rows=(starts, stops))
+
+    @classmethod
+    def from_csv(cls, input_path: str, delimiter: str = ";") -> 'Dataset':
+        """Loads the large .csv created by collect(), see helpers.get_large_csv()"""
+        from . import helpers
+        return cls.from_frame(helpers.get_large_csv(input_path, delimiter))
+
+    @property
+    def shape(self) -> tuple:
+        return self.present.shape
+
+    def trial(self, physicalisation, participant, orientation) -> 'Trial':
+        """Selects one trial, e.g. ds.trial(1, 8, 'N').conditions([0, 2]).frame()
+        Args:
+            physicalisation, participant, orientation: the trial to select
+        Returns:
+            A Trial, which only takes its rows from the dataset when asked for
+        Raises:
+            KeyError: if the dataset holds no such trial
+        """
+        position = tuple(self.levels[axis].get_loc(value) for axis, value in zip(self.axes[:3], [physicalisation, participant, orientation]))
+        return Trial(self, position)
+
+    def trials(self) -> pd.MultiIndex:
+        """The (physicalisation, participant, orientation) of all trials holding any rows"""
+        recorded = self.present.any(axis=(3, 4))
+        index = pd.MultiIndex.from_product([self.levels[axis] for axis in self.axes[:3]], names=self.axes[:3])
+        return index[recorded.ravel()]
+
+    def condition_arrays(self, columns: list) -> tuple:
+        """Arranges the arrays per cube in each trial, with the conditions as the last axis
+        Args:
+            columns: the columns to arrange, e.g. ['o','x','y']
+        Returns:
+            The (physicalisation, participant, orientation, cube) index of the rows, and a dict with a
+            (rows, conditions) array per column, for every cube in a trial that holds any rows
+        """
+        conditions = len(self.levels['condition'])
+        recorded = np.moveaxis(self.present, 3, -1).reshape(-1, conditions).any(axis=1)
+        names = ['physicalisation', 'participant', 'orientation', 'cube']
+        index = pd.MultiIndex.from_product([self.levels[axis] for axis in names], names=names)
+        arrays = {column: np.moveaxis(getattr(self, column), 3, -1).reshape(-1, conditions)[recorded] for column in columns}
+        return index[recorded], arrays
+
+    def cubes(self, columns: list, where: np.ndarray = None) -> pd.DataFrame:
+        """Lists the rows of the frame as a table, with the index as columns
+        Args:
+            columns: the columns to list, e.g. ['g','x','y']
+            where: optionally, a boolean array selecting fewer rows than those present
+        Returns:
+            A dataframe in the order of (physicalisation, participant, orientation, condition, cube)
+        """
+        selected = self.present if where is None else (self.present & where)
+        positions = np.nonzero(selected)
+        table = {axis: self.levels[axis].to_numpy()[codes] for axis, codes in zip(self.axes, positions)}
+        for column in columns:
+            table[column] = getattr(self, column)[positions]
+        return pd.DataFrame(table)
+
+
+class Trial:
+    """One trial of a Dataset, or some of its conditions, see Dataset.trial()
+    Columns are taken from the arrays of the dataset as (condition, cube) arrays, e.g. trial['x'].
+    These are views of the arrays, unless the selected conditions are not consecutive.
+    """
+
+    def __init__(self, dataset: Dataset, position: tuple, conditions=slice(None)):
+        self.dataset = dataset
+        self.position = position
+        self.selection = conditions
+
+    @property
+    def key(self) -> tuple:
+        """The (physicalisation, participant, orientation) of the trial"""
+        return tuple(self.dataset.levels[axis][i] for axis, i in zip(Dataset.axes[:3], self.position))
+
+    def conditions(self, conditions: list) -> 'Trial':
+        """Selects some conditions of the trial, e.g. [0, 2]
+        Raises:
+            KeyError: if the dataset holds no such condition
+        """
+        positions = [self.dataset.levels['condition'].get_loc(condition) for condition in conditions]
+        # keep a run of consecutive conditions as a slice, so its arrays stay views
+        if positions and positions == list(range(positions[0], positions[-1] + 1)):
+            return Trial(self.dataset, self.position, slice(positions[0], positions[-1] + 1))
+        return Trial(self.dataset, self.position, positions)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return getattr(self.dataset, column)[self.position][self.selection]
+
+    @property
+    def present(self) -> np.ndarray:
+        return self['present']
+
+    def frame(self) -> pd.DataFrame:
+        """The rows of the selected conditions, in the layout of the frame the dataset was built from
+        A slice of that frame where possible, otherwise a dataframe created from the arrays
+        """
+        if self.dataset.frame is None:
+            return self._from_arrays()
+
+        starts = self.dataset._starts[self.position][self.selection]
+        stops = self.dataset._stops[self.position][self.selection]
+        held = stops > starts
+        starts, stops = starts[held], stops[held]
+        if not len(starts):
+            return self.dataset.frame.iloc[0:0]
+        if np.array_equal(starts[1:], stops[:-1]):
+            return self.dataset.frame.iloc[starts[0]:stops[-1]]
+        return self.dataset.frame.iloc[np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)])]
+
+    def _from_arrays(self) -> pd.DataFrame:
+        conditions, cubes = np.nonzero(self.present)
+        physicalisation, participant, orientation = self.key
+
+        values = {
+            'physicalisation': np.repeat(physicalisation, len(conditions)),
+            'participant': np.repeat(participant, len(conditions)),
+            'orientation': np.repeat(orientation, len(conditions)),
+            'condition': self.dataset.levels['condition'].to_numpy()[self.selection][conditions],
+            'cube': self.dataset.levels['cube'].to_numpy()[cubes],
+        }
+        names = self.dataset.index_names
+        index = pd.MultiIndex.from_arrays([values[name] for name in names], names=names)
+        return pd.DataFrame({column: self[column][conditions, cubes] for column in Dataset.columns}, index=index)
+
+
+class Heatmap:
+    """The heatmap data of one table of helpers.get_heatmap_csv(), arranged once as a dense (physicalisation, cube) array
+    Attributes:
+        physicalisations: the physicalisation of each row
+        values: the value of each cube per physicalisation, where the column of cube n is n-1
+        colours: the values as mapped on the colorscale, i.e. -4 for cubes without a value
+        maximum: the highest value over all physicalisations
+    """
+
+    def __init__(self, physicalisations: pd.Index, values: np.ndarray):
+        self.physicalisations = physicalisations
+        self.values = values
+        self.colours = np.where(values == 0, -4, values)
+        self.maximum = np.nanmax(values) if values.size else np.nan
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> 'Heatmap':
+        """Arranges a table indexed by physicalisation, with a column per cube (as in IDs_changed_0-1.csv)"""
+        return cls(frame.index, frame.to_numpy())
+
+    def row(self, physicalisation) -> np.ndarray:
+        """The values of all cubes of one physicalisation"""
+        return self.values[self.physicalisations.get_loc(physicalisation)]
+
+    def lookup(self, physicalisation, cubes: np.ndarray) -> tuple:
+        """Gathers the values and colours of a number of cubes at once
+        Args:
+            physicalisation: the physicalisation of the cubes
+            cubes: the IDs of the cubes
+        Returns:
+            A tuple of the values, and the colours of the cubes
+        """
+        position = self.physicalisations.get_loc(physicalisation)
+        columns = np.asarray(cubes, dtype=int) - 1
+        return self.values[position, columns], self.colours[position, columns]
@@ -1,8 +1,28 @@
 from pathlib import Path
+import hashlib
+import json
+import re
+import shutil
+
+import numpy as np
 import pandas as pd
 
+from . import profiling
+
 naming_columns = ['participant','physicalisation','orientation','condition','cube', 'h', 'o', 'g', 'x', 'y']
 
+# the types of the columns of the large .csv (the index levels are read as numbers where possible)
+column_dtypes = {'h': 'float64', 'o': str, 'g': 'float64', 'x': 'float64', 'y': 'float64'}
+
+# the columns of the .csv file of a trial, where the coordinates are 'x,y'
+trial_columns = ['cube', 'h', 'o', 'g', 'coordinates']
+
+# the encoding of the .csv file of a trial, skipping the byte order mark that e.g. Excel starts a UTF-8 file with
+trial_encoding = 'utf-8-sig'
+
+# the name of the .csv file of a trial, e.g. P8_1_N_0: participant 8, physicalisation 1, orientation N and condition 0
+trial_filename = re.compile(r'P(?P<participant>\d+)_(?P<physicalisation>\d+)_(?P<orientation>[A-Za-z]+)_(?P<condition>\d+)')
+
 def create_output_folder(output_path: str) -> Path:
     """Creates a path to store output data if it does not exists.
     Args:
@@ -15,18 +35,516 @@ def create_output_folder(output_path: str) -> Path:
         path.mkdir(parents=True, exist_ok=True)
     return path
 
-def get_large_csv(input_path: str, delimiter: str = ";", index_col: list = naming_columns[:5]) -> pd.DataFrame:
+def get_large_csv(input_path: str, delimiter: str = ";", index_col: list = naming_columns[:5], cache: bool = True, compact: bool = True) -> pd.DataFrame:
     """Get the large .csv as a DataFrame (must have created it first using collect())
+    Loads the binary sidecar written next to the .csv instead, when it was made from the very same .csv
     Args:
         path: the path from user in any format (relative, absolute, etc.)
+        cache: if true, read from (and write) the binary sidecar
+        compact: if true, stores the columns in compact types, see compact_frame()
     Returns:
         A pandas dataframe
     """
-    frame = pd.read_csv(input_path, index_col=index_col, header=0, delimiter=delimiter, keep_default_na=False)
-    frame.sort_index()
-    frame = frame.apply(pd.to_numeric, errors='ignore')
+    if cache:
+        frame = load_large_csv_cache(input_path, index_col)
+        if frame is not None:
+            return compact_frame(frame) if compact else frame
+
+    with profiling.stage('read csv'):
+        # read the columns as their types at once, where only empty numbers are missing (an empty 'o' stays '')
+        frame = pd.read_csv(input_path, index_col=index_col, header=0, delimiter=delimiter, keep_default_na=False,
+                            dtype=column_dtypes, na_values={column: [''] for column, dtype in column_dtypes.items() if dtype != str})
+        frame.sort_index()
+
+    if cache:
+        save_large_csv_cache(frame, input_path)
+    return compact_frame(frame) if compact else frame
+
+
+def get_tasks_csv(input_path: str, delimiter: str = ";") -> list:
+    """Get a list of images to print from a .csv file, see the files in physvis/tasks for examples
+    Each row holds the phys, part(icipant), view and cond(itions) to render, e.g. '1;8;N;0,2;;'
+    optionally with baseline = 1, or data = 1 or 2 (the heatmap data to use)
+    Args:
+        input_path: the path from user in any format (relative, absolute, etc.)
+    Returns:
+        A list of tasks for printvis(), without duplicates
+    """
+    columns = ['phys', 'part', 'view', 'cond', 'baseline', 'data']
+    frame = pd.read_csv(input_path, header=0, delimiter=delimiter, dtype=str, keep_default_na=False)
+
+    missing = [column for column in columns[:4] if column not in frame.columns]
+    if missing:
+        raise ValueError(f"The tasks in {input_path} are missing the column(s) {missing}, expected {columns}")
+
+    tasks = []
+    seen = set()
+    for row in frame.itertuples(index=False):
+        row = row._asdict()
+        try:
+            task = {
+                'phys': int(row['phys']),
+                'part': int(row['part']),
+                'view': row['view'].strip().upper(),
+                'cond': [int(condition) for condition in row['cond'].split(',')],
+            }
+            if row.get('baseline', '').strip() not in ('', '0'):
+                task['baseline'] = True
+            if row.get('data', '').strip() != '':
+                task['data'] = int(row['data'])
+        except ValueError as e:
+            raise ValueError(f"Could not read the task {dict(row)} in {input_path}: {e}") from e
+
+        key = tuple((name, tuple(value) if isinstance(value, list) else value) for name, value in task.items())
+        if key not in seen:
+            seen.add(key)
+            tasks.append(task)
+
+    if len(tasks) < len(frame.index):
+        print(f"Removed {len(frame.index) - len(tasks)} duplicate task(s) from {input_path}")
+    return tasks
+
+
+def read_trial_csv(filename: Path, delimiter: str = ";") -> pd.DataFrame:
+    """Reads the .csv file of one trial in a single pass, with the trial (from its filename) as the first columns
+    The coordinates ('x,y') are read as two columns of numbers right away, see trial_columns and trial_filename
+    Args:
+        filename: the .csv file of the trial, e.g. P8_1_N_0.csv
+        delimiter: the delimiter of the columns, defaults to ';'
+    Returns:
+        A pandas dataframe with the naming_columns, where the participant, physicalisation, orientation and condition are text
+    Raises:
+        ValueError: if the filename, columns or values are not those of a trial
+    """
+    filename = Path(filename)
+    name = trial_filename.fullmatch(filename.stem)
+    if name is None:
+        raise ValueError(f"The name of {filename} is not that of a trial, expected e.g. 'P8_1_N_0.csv' (participant, physicalisation, orientation, condition)")
+
+    with open(filename, newline='', encoding=trial_encoding) as file:
+        header = file.readline().rstrip('\r\n').split(delimiter)
+        # the files end each line with a delimiter, i.e. an unnamed column
+        while header and header[-1].strip() == '':
+            header.pop()
+        if [column.strip() for column in header] != trial_columns:
+            raise ValueError(f"{filename} has the columns {header}, expected {trial_columns}")
+
+        try:
+            frame = pd.read_csv(file, header=None, names=trial_columns, index_col=False,
+                                delimiter=delimiter, keep_default_na=False, dtype={'cube': 'int64', 'coordinates': str, **column_dtypes},
+                                na_values={column: [''] for column, dtype in column_dtypes.items() if dtype != str})
+            # split only the coordinates ('x,y') into x and y, where empty coordinates are missing
+            coordinates = [value.split(',') if value else ['', ''] for value in frame.pop('coordinates').tolist()]
+            if any(len(value) != 2 for value in coordinates):
+                raise ValueError("not all coordinates are of the form 'x,y'")
+            coordinates = np.array(coordinates, dtype=object).reshape(-1, 2)
+            coordinates[coordinates == ''] = np.nan
+            frame['x'], frame['y'] = coordinates.T.astype('float64')
+        except (ValueError, pd.errors.ParserError) as e:
+            raise ValueError(f"{filename} holds a value that is not of the type of its column: {e}") from e
+
+    # prepend the trial, from the filename, to each row
+    for i, level in enumerate(naming_columns[:4]):
+        frame.insert(i, level, name[level])
     return frame
 
+
+def cache_path(input_path: str) -> Path:
+    """The location of the binary sidecar of a large .csv, e.g. 'output/combined.npz'"""
+    return Path(input_path).with_suffix('.npz')
+
+
+def fingerprint(input_path: str, digest: bool = True) -> dict:
+    """Identifies the contents of a file by its size, modification time and (optionally) hash
+    Args:
+        input_path: the file to identify
+        digest: if false, skip hashing the content of the file
+    Returns:
+        A dictionary with 'size', 'mtime' and 'sha1'
+    """
+    path = Path(input_path)
+    stat = path.stat()
+    result = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha1': None}
+
+    if digest:
+        sha1 = hashlib.sha1()
+        with path.open('rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                sha1.update(block)
+        result['sha1'] = sha1.hexdigest()
+    return result
+
+
+def as_read(frame: pd.DataFrame) -> pd.DataFrame:
+    """Converts a frame created by collect() into the types get_large_csv() would read back from the .csv
+    i.e. numeric index levels, and empty strings rather than NaN for missing text
+    """
+    frame = frame.copy()
+    frame.index = pd.MultiIndex.from_arrays(
+        [pd.to_numeric(frame.index.get_level_values(i), errors='ignore') for i in range(frame.index.nlevels)],
+        names=frame.index.names)
+    for column in frame.columns[frame.dtypes == object]:
+        frame[column] = frame[column].fillna('')
+    return frame
+
+
+def _small_int(values: pd.Series) -> pd.Series:
+    # the smallest nullable integer type holding all (whole) numbers of a column, or the column as-is
+    numbers = values.dropna()
+    if not pd.api.types.is_numeric_dtype(values) or not (numbers == numbers.round()).all():
+        return values
+    for dtype in ['Int8', 'Int16', 'Int32']:
+        info = np.iinfo(dtype.lower())
+        if not len(numbers) or (info.min <= numbers.min() and numbers.max() <= info.max):
+            return values.astype(dtype)
+    return values
+
+
+@profiling.profiled('compact frame')
+def compact_frame(frame: pd.DataFrame, report: bool = True) -> pd.DataFrame:
+    """Stores the columns of a large frame in compact types
+    i.e. categorical orientations (o), nullable small integers for heights (h) and groups (g), and float32
+    coordinates (x, y - these are halves on a small grid, so float32 holds them exactly, otherwise they are kept). The MultiIndex
+    already stores each level as small integer codes of its unique values, so it is only made numeric
+    Args:
+        frame: the data frame, as created by collect() or returned by get_large_csv()
+        report: if true, prints the memory used before and after
+    Returns:
+        A pandas dataframe with the same values
+    """
+    before = frame.memory_usage(index=True, deep=True).sum()
+
+    frame = frame.copy()
+    if isinstance(frame.index, pd.MultiIndex):
+        levels = [pd.to_numeric(level, errors='ignore') for level in frame.index.levels]
+        if any(level.dtype != original.dtype for level, original in zip(levels, frame.index.levels)):
+            # e.g. participants read from file names, which sort differently as numbers
+            frame.index = frame.index.set_levels(levels, verify_integrity=False)
+            frame = frame.sort_index()
+
+    for column in frame.columns:
+        if column == 'o':
+            frame[column] = frame[column].astype('category')
+        elif column in ('h', 'g'):
+            frame[column] = _small_int(frame[column])
+        elif column in ('x', 'y') and pd.api.types.is_float_dtype(frame[column]):
+            single = frame[column].astype('float32')
+            if (single.isna() | (single == frame[column])).all():
+                frame[column] = single
+
+    if report:
+        after = frame.memory_usage(index=True, deep=True).sum()
+        print(f"Compacted the frame from {before / 1e6:.2f} MB to {after / 1e6:.2f} MB")
+    return frame
+
+
+def _plain(values: np.ndarray) -> np.ndarray:
+    # the values as an array of numbers or text, that np.load() reads without unpickling (None if it can not)
+    if values.dtype != object:
+        return values
+    if not all(isinstance(value, str) for value in values):
+        return None
+    return values.astype(str)
+
+
+def _unplain(values: np.ndarray) -> np.ndarray:
+    # text is read back as objects, as pandas stores it
+    return values.astype(object) if values.dtype.kind == 'U' else values
+
+
+@profiling.profiled('save sidecar')
+def save_large_csv_cache(frame: pd.DataFrame, input_path: str) -> bool:
+    """Stores a frame read from a large .csv as a typed, binary (.npz) sidecar of that .csv
+    Args:
+        frame: the data frame, as returned by get_large_csv()
+        input_path: the large .csv the frame was read from
+    Returns:
+        True if the sidecar was written, False if the frame can not be stored this way, or not next to the .csv
+    """
+    if not isinstance(frame.index, pd.MultiIndex):
+        return False
+
+    arrays = {}
+    for i, level in enumerate(frame.index.levels):
+        arrays[f"level_{i}"] = level.to_numpy()
+        arrays[f"codes_{i}"] = frame.index.codes[i]
+    for i, column in enumerate(frame.columns):
+        arrays[f"column_{i}"] = frame[column].to_numpy()
+
+    # only store plain numbers and text, so the sidecar can be loaded without unpickling
+    for key, values in arrays.items():
+        arrays[key] = _plain(values)
+        if arrays[key] is None:
+            return False
+
+    meta = {
+        'index': list(frame.index.names),
+        'columns': list(frame.columns),
+        'fingerprint': fingerprint(input_path),
+    }
+    arrays['meta'] = np.array(json.dumps(meta))
+
+    # write to a temporary file first, so an interrupted save never leaves a broken sidecar
+    path = cache_path(input_path)
+    temporary = path.with_name(path.stem + '.tmp.npz')
+    try:
+        np.savez(temporary, **arrays)
+        temporary.replace(path)
+    except OSError as e:
+        # e.g. a read-only folder of data: the sidecar only saves time, so continue without it
+        print(f"Could not cache {input_path} as {path}: {e}")
+        if temporary.is_file():
+            temporary.unlink()
+        return False
+    return True
+
+
+@profiling.profiled('load sidecar')
+def load_large_csv_cache(input_path: str, index_col: list = naming_columns[:5]) -> pd.DataFrame:
+    """Loads the binary sidecar of a large .csv, if it matches the current .csv
+    Args:
+        input_path: the large .csv
+        index_col: the index the frame should have
+    Returns:
+        A pandas dataframe, or None if there is no (matching) sidecar
+    """
+    path = cache_path(input_path)
+    if not path.exists() or not Path(input_path).exists():
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            if meta['index'] != list(index_col):
+                return None
+
+            # compare the cheap properties before hashing the entire .csv
+            current = fingerprint(input_path, digest=False)
+            if (current['size'], current['mtime']) != (meta['fingerprint']['size'], meta['fingerprint']['mtime']):
+                return None
+            if fingerprint(input_path)['sha1'] != meta['fingerprint']['sha1']:
+                return None
+
+            index = pd.MultiIndex(
+                levels=[_unplain(arrays[f"level_{i}"]) for i in range(len(meta['index']))],
+                codes=[arrays[f"codes_{i}"] for i in range(len(meta['index']))],
+                names=meta['index'],
+                verify_integrity=False)
+            return pd.DataFrame({column: _unplain(arrays[f"column_{i}"]) for i, column in enumerate(meta['columns'])}, index=index)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Could not use the cached {path}, reading {input_path} instead: {e}")
+        return None
+
+
+# the levels the store is partitioned by: a folder per study, with a file per physicalisation
+partitions = ['study', 'physicalisation']
+
+
+def store_path(input_path: str) -> Path:
+    """The location of the partitioned store written next to a large .csv, e.g. 'output/store'"""
+    return Path(input_path).parent / 'store'
+
+
+def _partition_name(level: str, value) -> str:
+    return f"{level}={value}"
+
+
+def _partition_value(name: str) -> str:
+    return name.split('=', 1)[1]
+
+
+def _selected(values, wanted: list) -> np.ndarray:
+    # filters are compared as text, so e.g. participant '8' (from the command line) selects participant 8
+    return np.isin(np.asarray(values).astype(str), [str(value) for value in wanted])
+
+
+@profiling.profiled('save store')
+def save_store(frame: pd.DataFrame, store: str, study: str, source: str = None) -> int:
+    """Stores a collected frame in a partitioned store, replacing the partitions of the study, e.g.
+    store/study=pilot/physicalisation=1.npz holds all rows of physicalisation 1 of the study 'pilot'
+    Each partition holds an array per index level and column, so loaders can read only the columns they use
+    Args:
+        frame: the data frame, as created by collect() or returned by get_large_csv()
+        store: the folder of the store, shared by all studies
+        study: the name of the study
+        source: optionally, the large .csv holding the same frame, which get_collected() may then read from the store
+    Returns:
+        The number of partitions written
+    """
+    frame = as_read(frame)
+    folder = create_output_folder(store) / _partition_name('study', study)
+    names = [name for name in frame.index.names if name != 'physicalisation']
+
+    # write to a temporary folder first, so an interrupted save never leaves a study half replaced
+    temporary = folder.with_name(folder.name + '.tmp')
+    if temporary.exists():
+        shutil.rmtree(temporary)
+    temporary.mkdir()
+
+    # the position of each row in the frame, to load the rows in the same order
+    frame = frame.assign(**{'': np.arange(len(frame))})
+    source = fingerprint(source) if source is not None else None
+
+    written = 0
+    for physicalisation, rows in frame.groupby(level='physicalisation', sort=True):
+        arrays = {name: rows.index.get_level_values(name).to_numpy() for name in names}
+        arrays['row'] = rows.pop('').to_numpy()
+        arrays.update({column: rows[column].to_numpy() for column in rows.columns})
+        arrays = {key: _plain(values) for key, values in arrays.items()}
+        unstorable = [key for key, values in arrays.items() if values is None]
+        if unstorable:
+            shutil.rmtree(temporary)
+            raise ValueError(f"Can not store the column(s) {unstorable} of physicalisation {physicalisation}: only numbers and text can be stored")
+
+        meta = {'index': list(frame.index.names), 'columns': list(rows.columns), 'rows': len(rows), 'fingerprint': source}
+        np.savez(temporary / (_partition_name('physicalisation', physicalisation) + '.npz'), meta=np.array(json.dumps(meta)), **arrays)
+        written += 1
+
+    if folder.exists():
+        shutil.rmtree(folder)
+    temporary.replace(folder)
+    return written
+
+
+def stored_study(store: str, input_path: str) -> str:
+    """The study of which the store holds the same data as the large .csv, see save_store()
+    Args:
+        store: the folder of the store
+        input_path: the large .csv
+    Returns:
+        The name of the study, or None if the store holds no study of this .csv (e.g. when the .csv was replaced since)
+    """
+    if not Path(input_path).exists():
+        return None
+    current = fingerprint(input_path, digest=False)
+    for folder in sorted(Path(store).glob(_partition_name('study', '*'))):
+        path = next(folder.glob(_partition_name('physicalisation', '*') + '.npz'), None)
+        if not folder.is_dir() or folder.name.endswith('.tmp') or path is None:
+            continue
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                source = json.loads(str(arrays['meta'])).get('fingerprint')
+        except (OSError, KeyError, ValueError):
+            continue
+        # compare the cheap properties before hashing the entire .csv
+        if source is None or (current['size'], current['mtime']) != (source['size'], source['mtime']):
+            continue
+        if current['sha1'] is None:
+            current = fingerprint(input_path)
+        if current['sha1'] == source['sha1']:
+            return _partition_value(folder.name)
+    return None
+
+
+@profiling.profiled('load store')
+def load_store(store: str, study: list = None, physicalisation: list = None, participant: list = None, orientation: list = None,
+               columns: list = None, index_col: list = naming_columns[:5]) -> pd.DataFrame:
+    """Loads the rows matching the filters from a partitioned store, see save_store()
+    Only the partitions of the selected studies and physicalisations are opened, and of these, only the columns asked for
+    Args:
+        store: the folder of the store
+        study, physicalisation, participant, orientation: optionally, the values to select (any of them)
+        columns: optionally, the columns to load, by default all
+        index_col: the index the frame should have
+    Returns:
+        A pandas dataframe, as get_large_csv() would return it (without compacting it). When rows of several studies are
+        loaded, the index has a 'study' level in front, to keep their participants apart
+    Raises:
+        FileNotFoundError: if the store holds no partitions matching the filters
+    """
+    files = []
+    for folder in sorted(Path(store).glob(_partition_name('study', '*'))):
+        if not folder.is_dir() or folder.name.endswith('.tmp') or (study and not _selected([_partition_value(folder.name)], study)[0]):
+            continue
+        for path in sorted(folder.glob(_partition_name('physicalisation', '*') + '.npz')):
+            if physicalisation and not _selected([_partition_value(path.stem)], physicalisation)[0]:
+                continue
+            files.append((_partition_value(folder.name), _partition_value(path.stem), path))
+    if not files:
+        raise FileNotFoundError(f"The store {store} holds no data of study {study or 'any'} and physicalisation {physicalisation or 'any'}")
+
+    studies = {name for name, _, _ in files}
+    frames, order = [], []
+    for name, value, path in files:
+        with np.load(path, allow_pickle=False) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            if sorted(meta['index']) != sorted(index_col):
+                raise ValueError(f"The store {store} is indexed by {meta['index']}, not {list(index_col)}")
+
+            # select the rows on the index arrays, before reading any of the columns
+            rows = np.ones(meta['rows'], dtype=bool)
+            if participant:
+                rows &= _selected(arrays['participant'], participant)
+            if orientation:
+                rows &= _selected(arrays['orientation'], orientation)
+            if not rows.any():
+                continue
+
+            index = {level: _unplain(arrays[level][rows]) for level in meta['index'] if level != 'physicalisation'}
+            index['physicalisation'] = np.repeat(pd.to_numeric(pd.Series([value]), errors='ignore').to_numpy(), np.count_nonzero(rows))
+            index['study'] = np.repeat(np.array([name], dtype=object), np.count_nonzero(rows))
+            data = {column: _unplain(arrays[column][rows]) for column in meta['columns'] if columns is None or column in columns}
+            order.append(np.column_stack([np.full(np.count_nonzero(rows), sorted(studies).index(name)), arrays['row'][rows]]))
+        levels = (['study'] if len(studies) > 1 else []) + list(index_col)
+        frames.append(pd.DataFrame(data, index=pd.MultiIndex.from_arrays([index[level] for level in levels], names=levels)))
+
+    if not frames:
+        raise FileNotFoundError(f"The store {store} holds no data of participant {participant or 'any'} and orientation {orientation or 'any'}")
+    # in the order of the collected frame(s)
+    order = np.concatenate(order)
+    return pd.concat(frames).take(np.lexsort((order[:, 1], order[:, 0])))
+
+
+def get_collected(input_path: str, delimiter: str = ";", store: str = None, columns: list = None, compact: bool = True, **filters) -> pd.DataFrame:
+    """Loads the data collected by collect(), or only the part matching the filters
+    The store (written by collect() next to the large .csv) is read when it is given, or when a study is selected, which
+    may hold several studies. Otherwise, this is the data of the large .csv: only the matching partitions of its study
+    are read from the store, if it still holds the same data, or else the large .csv is read (and filtered)
+    Args:
+        input_path: the large .csv
+        store: the folder of the store to read, by default the one next to the large .csv (when it matches)
+        columns: optionally, the columns to load from the store, by default all
+        compact: if true, stores the columns in compact types, see compact_frame()
+        filters: optionally, a list of values to select of study, physicalisation, participant and/or orientation
+    Returns:
+        A pandas dataframe, with a 'study' level in front of its index if it holds several studies
+    Raises:
+        FileNotFoundError: if no data matches the filters
+    """
+    filters = {level: values for level, values in filters.items() if values}
+    if store is None and 'study' not in filters:
+        # read the study of the large .csv from the store, only if it holds the very same data (i.e. the .csv was not replaced since)
+        study = stored_study(store_path(input_path), input_path)
+        if study is not None:
+            store, filters['study'] = store_path(input_path), [study]
+
+    if store is not None or 'study' in filters:
+        store = store_path(input_path) if store is None else Path(store)
+        if not store.is_dir():
+            raise FileNotFoundError(f"There is no store at {store} to load studies from, run collect first")
+        frame = load_store(store, columns=columns, **filters)
+    elif not filters:
+        return get_large_csv(input_path, delimiter, compact=compact)
+    else:
+        frame = get_large_csv(input_path, delimiter, compact=False)
+        rows = np.ones(len(frame), dtype=bool)
+        for level, values in filters.items():
+            rows &= _selected(frame.index.get_level_values(level), values)
+        if not rows.any():
+            raise FileNotFoundError(f"{input_path} holds no data of {filters}")
+        frame = frame[rows]
+    return compact_frame(frame) if compact else frame
+
+
+def select_tasks(tasks: list, frame: pd.DataFrame) -> list:
+    """The tasks of get_tasks_csv() of which the trial is in the frame, e.g. as loaded with filters by get_collected()"""
+    trials = set(frame.index.droplevel(['condition', 'cube']).reorder_levels(['physicalisation', 'participant', 'orientation']))
+    selected = [task for task in tasks if (task['phys'], task['part'], task['view']) in trials]
+    if len(selected) < len(tasks):
+        print(f"Skipped {len(tasks) - len(selected)} task(s) of trials that are not loaded")
+    return selected
+
+
 def get_heatmap_csv(input_path: str, delimiter: str = ";", index_col: list = ['physicalisation']) -> pd.DataFrame:
     """Get the large .csv as a DataFrame (must have created it first using collect())
     Args:
@@ -1,382 +1,1016 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import repeat
+import hashlib
+import json
 import re
+import sys
+import tempfile
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
-import plotly.graph_objects as plot
 
-from . import helpers
+from . import helpers, profiling
+from .dataset import Dataset, Heatmap
 
 
 
-def printvis(frame: pd.DataFrame, tasks: list, data:list = None) -> None:
-    """save 3D renderings of Data series
+# the corners of a cube (as -1/+1 half widths and 0/1 height), and the triangles of its six faces
+_corners = np.array([
+    [-1, 1, 1, -1, -1, 1, 1, -1],
+    [-1, -1, 1, 1, -1, -1, 1, 1],
+    [0, 0, 0, 0, 1, 1, 1, 1],
+])
+_triangles = np.array([
+    [0, 0, 4, 4, 0, 0, 1, 1, 2, 2, 3, 3],
+    [1, 2, 5, 6, 1, 5, 2, 6, 3, 7, 0, 4],
+    [2, 3, 6, 7, 5, 4, 6, 5, 7, 6, 4, 7],
+])
+
+
+@profiling.profiled('figure geometry')
+def cubes_geometry(cubes: pd.DataFrame, width: float = .5, height: float = 1) -> dict:
+    """Calculates the vertices and triangles of all cubes, to draw these as one mesh
     Args:
-        frame: the data frame storing data to be rendered
+        cubes: the rows of the cubes, with 'h', 'o', 'x' and 'y' columns
+        width: half the width of a cube
+        height: the height of a cube
     Returns:
-        nothing
+        A dictionary with the x, y, z, i, j and k arrays of a Mesh3d, and which cubes are present
     """
+    x, y = cubes['x'].to_numpy(dtype=float, na_value=np.nan), cubes['y'].to_numpy(dtype=float, na_value=np.nan)
+    h, o = cubes['h'].to_numpy(dtype=float, na_value=np.nan), cubes['o'].to_numpy()
+
+    # missing cubes are not drawn
+    present = ~(np.isnan(x) | np.isnan(y))
+    x, y, h, o = x[present], y[present], h[present], o[present]
+
+    # overrule widths based on orientation
+    # note that a orientation in y, adds width to the 'x' direction - and vise versa
+    wx = np.where(o == 'x', h / 2, width)
+    wy = np.where(o == 'y', h / 2, width)
+    wz = np.where(o == 'z', h, height)
+
+    # eight x, y, and z coordinates form a cube
+    vertices = np.stack([
+        x[:, None] + _corners[0] * wy[:, None],
+        y[:, None] + _corners[1] * wx[:, None],
+        _corners[2] * wz[:, None],
+    ])
+    faces = _triangles[:, None, :] + 8 * np.arange(len(x))[None, :, None]
+
+    return {
+        'x': vertices[0].ravel(), 'y': vertices[1].ravel(), 'z': vertices[2].ravel(),
+        'i': faces[0].ravel(), 'j': faces[1].ravel(), 'k': faces[2].ravel(),
+        'present': present,
+    }
 
-    print("Generating visuals for")
 
-    # colors = ['Greys','YlGnBu','Greens','YlOrRd','Bluered','RdBu','Reds','Blues','Picnic','Rainbow','Portland','Jet','Hot','Blackbody','Earth','Electric','Viridis','Cividis']
-    # angles = [[17,15],[15,-17],[-17,-15],[-15,17]]
-    # angles = [[17,15]]
-
-    phys_angles = {
-        1: [15,  -17],
-        2: [15, -17],
-        3: [17,   15],
-        4: [17,   15],
-        5: [-15, 17],
-        6: [-15, 17]
-    }
+def cubes_mesh(cubes: pd.DataFrame, values: np.ndarray, width: float = .5, height: float = 1, geometry: dict = None, **kwargs) -> 'plotly.graph_objects.Mesh3d':
+    """Creates one mesh of all cubes, rather than one trace per cube
+    Args:
+        cubes: the rows of the cubes, with 'h', 'o', 'x' and 'y' columns
+        values: the value of each cube, mapped on the colorscale
+        width: half the width of a cube
+        height: the height of a cube
+        geometry: the result of cubes_geometry() for these cubes, if calculated before
+        **kwargs: any other Mesh3d properties, e.g. cmin, cmax and colorscale
+    Returns:
+        A plotly Mesh3d trace
+    """
+    # plotly is only imported once something is rendered, so collect() does not wait for it
+    import plotly.graph_objects as plot
 
-    colorscale = [
-        [0, 'rgb(29,123,180)'],
-        [.25, 'rgb(57,177,135)'],
-        [.5, 'rgb(241,206,28)'],
-        [.75, 'rgb(238,116,73)'],
-        [1, 'rgb(37,55,123)']
-    ]
+    if geometry is None:
+        geometry = cubes_geometry(cubes, width, height)
+    values = np.asarray(values, dtype=float)[geometry['present']]
 
-    datacolorscale = [
-        [0, 'rgb(255,255,255)'],
-        [1, 'rgb(255,0,0)']
-    ]
+    return plot.Mesh3d(
+        x=geometry['x'], y=geometry['y'], z=geometry['z'],
+        i=geometry['i'], j=geometry['j'], k=geometry['k'],
+        intensity=np.repeat(values, 8),
+        hoverinfo="none",
+        showscale=False,
+        flatshading=True,
+        **kwargs,
+    )
 
-    for task in tasks:
 
-        # get the specific index from the dataframe
-        query = f"physicalisation == {task['phys']} and participant == {task['part']} and orientation == '{task['view']}'"
-        print(' - '+ query)
+# colors = ['Greys','YlGnBu','Greens','YlOrRd','Bluered','RdBu','Reds','Blues','Picnic','Rainbow','Portland','Jet','Hot','Blackbody','Earth','Electric','Viridis','Cividis']
+# angles = [[17,15],[15,-17],[-17,-15],[-15,17]]
+# angles = [[17,15]]
 
-        # conditions
-        remove_cond = [x for x in [0,1,2] if x not in task['cond']]
+phys_angles = {
+    1: [15,  -17],
+    2: [15, -17],
+    3: [17,   15],
+    4: [17,   15],
+    5: [-15, 17],
+    6: [-15, 17]
+}
 
-        target = frame.query(query).drop(remove_cond, level='condition')
+colorscale = [
+    [0, 'rgb(29,123,180)'],
+    [.25, 'rgb(57,177,135)'],
+    [.5, 'rgb(241,206,28)'],
+    [.75, 'rgb(238,116,73)'],
+    [1, 'rgb(37,55,123)']
+]
 
-        max_group = int(target['g'].max())
-        camera = phys_angles[task['phys']]
+datacolorscale = [
+    [0, 'rgb(255,255,255)'],
+    [1, 'rgb(255,0,0)']
+]
 
-        # eight x, y, and z coordinates form a cube
-        # reference: https://plotly.com/python/reference/isosurface/
+export_settings = dict(width=600, height=400, scale=5)
 
+# change this whenever a change in task_figure() changes the exported images, to export these again
+render_version = 1
 
 
-        fig= plot.Figure(
-            layout_title_text=""
-        )
+def task_query(task: dict) -> str:
+    # the description of the trial of a task, as used in the names of exported images
+    return f"physicalisation == {task['phys']} and participant == {task['part']} and orientation == '{task['view']}'"
 
-        # numbers hovering over cubes
-        total_cond = len(task['cond'])
-        count = 0
-
-        for condition, all_cubes in target.groupby('condition'):
-            count += 1
-            annotations = []
-
-            if 'data' in task:
-                #  max_value = data[task['data']-1].loc[task['phys']].max();
-                max_value = data[task['data']-1].max().max();
-                print(f"max = {max_value}")
-
-            for row in all_cubes.itertuples():
-                cubeID = row.Index[-1]
-                if 'data' in task:
-                    cubevalue = data[task['data']-1].loc[task['phys']][int(cubeID)-1]
-                c = {
-                    # coordinates
-                    'x' : row.x,
-                    'y' : row.y,
-                    'z' : 1,
-                    # half widths
-                    'wx' : .45,
-                    'wy' : .45,
-                    # heigth
-                    'wz' : .9,
-                }
-                # overrule widths based on orientation
-                # note that a orientation in y, adds width to the 'x' direction - and vise versa
-                c['w' + row.o] = row.h / (1 if row.o == 'z' else 2)
-
-                fig.add_trace(
-                    plot.Isosurface(
-                        x=[c['x']-c['wy'], c['x']-c['wy'], c['x']-c['wy'], c['x']-c['wy'], c['x']+c['wy'], c['x']+c['wy'], c['x']+c['wy'], c['x']+c['wy']],
-                        y=[c['y']+c['wx'], c['y']-c['wx'], c['y']+c['wx'], c['y']-c['wx'], c['y']+c['wx'], c['y']-c['wx'], c['y']+c['wx'], c['y']-c['wx']],
-                        z=[c['wz'],        c['wz'],        0,              0,              c['wz'],        c['wz'],        0,               0],
-                        value=[0 if 'baseline' in task
-                               else ((-4 if cubevalue == 0 else cubevalue) if 'data' in task else row.g-1)
-                               ]*8,
-                        hoverinfo="none",
-                        showscale=False,
-                        opacity=(.2 if count < total_cond else 1),
-                        contour=dict(
-                            show=True
-                            ),
-                        isomin=0 if not 'data' in task else -4,       # remove the 'dark blue' harder to see
-                        isomax=4 if not 'data' in task else max_value,
-                        colorscale=datacolorscale if 'data' in task else colorscale,
-                        lighting = dict(
-                            diffuse=.9,
-                            ambient=.5,
-                        ),
-                        surface=dict(count=3, fill=0.7, pattern='odd'),
-                        ),
-                )
 
-                if 'data' in task:
-                    if cubevalue > 0:
-                        annotations.append(dict(
-                            x=c['x'],
-                            y=c['y'],
-                            z=c['wz'] + 1,
-                            text=' ' + str(cubevalue) + ' ',
-                            showarrow=False,
-                            # bgcolor="rgba(255,255,255,.7)",
-                            font=dict(
-                                color="black",
-                                size=20
-                            ),
-                            )
-                        )
-
-        fig.update_layout(
-            margin=dict(l=0, r=0, t=0, b=0),
-
-            scene = dict(
-                aspectratio=dict(
-                 x=20,
-                 y=20,
-                 z=5,
+def task_trial(frame: pd.DataFrame, task: dict) -> pd.DataFrame:
+    # the rows of the trial of a task, from the trial index of a Dataset, or looked up by key in a dataframe
+    if isinstance(frame, Dataset):
+        return frame.trial(task['phys'], task['part'], task['view']).frame()
+    return frame.xs((task['phys'], task['part'], task['view']), level=['physicalisation', 'participant', 'orientation'], drop_level=False)
+
+
+# the half width and height of cubes in printvis()
+print_width, print_height = .45, .9
+
+
+def _heatmap(data: list, task: dict) -> Heatmap:
+    # the heatmap data of a task, arranged into arrays (once, by printvis())
+    heatmap = data[task['data']-1]
+    return heatmap if isinstance(heatmap, Heatmap) else Heatmap.from_frame(heatmap)
+
+
+@profiling.profiled('figure')
+def task_figure(frame: pd.DataFrame, task: dict, data: list = None, trial: pd.DataFrame = None, geometry: dict = None) -> tuple:
+    """Create the 3D rendering of one task of printvis()
+    Args:
+        frame: the data frame storing data to be rendered, or a Dataset of it
+        task: the trial and conditions to render, e.g. {'phys': 1, 'part': 8, 'view': 'N', 'cond': [0,2]}
+        data: the heatmap data, if the task has a 'data' key
+        trial: the rows of the trial of the task, if selected before (then frame is not used)
+        geometry: the cubes_geometry() of the trial per condition, if calculated before
+    Returns:
+        A tuple of the plotly figure, and the path to export it to
+    """
+    import plotly.graph_objects as plot
+
+    # get the specific index from the dataframe
+    if trial is None:
+        trial = task_trial(frame, task)
+
+    # conditions
+    remove_cond = [x for x in [0,1,2] if x not in task['cond']]
+
+    target = trial.drop(remove_cond, level='condition')
+
+    max_group = int(target['g'].max())
+    camera = phys_angles[task['phys']]
+
+    # all cubes of a condition are drawn as one mesh, see cubes_mesh()
+    # reference: https://plotly.com/python/reference/mesh3d/
+
+    fig= plot.Figure(
+        layout_title_text=""
+    )
+
+    # numbers hovering over cubes
+    total_cond = len(task['cond'])
+    count = 0
+
+    for condition, all_cubes in target.groupby('condition'):
+        count += 1
+        annotations = []
+
+        if 'data' in task:
+            # look up the value and colour of all cubes at once, by their IDs
+            heatmap = _heatmap(data, task)
+            max_value = heatmap.maximum
+            cubevalues, values = heatmap.lookup(task['phys'], all_cubes.index.get_level_values('cube'))
+        elif 'baseline' in task:
+            values = np.zeros(len(all_cubes.index))
+        else:
+            values = all_cubes['g'].to_numpy(dtype=float, na_value=np.nan) - 1
+
+        fig.add_trace(
+            cubes_mesh(
+                all_cubes,
+                values,
+                width=print_width,
+                height=print_height,
+                geometry=geometry.get(condition) if geometry is not None else None,
+                opacity=(.2 if count < total_cond else 1),
+                cmin=0 if not 'data' in task else -4,       # remove the 'dark blue' harder to see
+                cmax=4 if not 'data' in task else max_value,
+                colorscale=datacolorscale if 'data' in task else colorscale,
+                lighting = dict(
+                    diffuse=.9,
+                    ambient=.5,
                 ),
-                xaxis = dict(
-                    showticklabels=False,
-                    # showaxeslabels=False,
-                    nticks=40,
-                    range=[0,20],
-                    showbackground=False,
-                    visible=True,
-                    title = dict(text=""),
-                    ),
-                yaxis = dict(
-                    showticklabels=False,
-                    # showaxeslabels=False,
-                    nticks=40,
-                    range=[0,20],
-                    showbackground=False,
-                    visible=True,
-                    title = dict(text=""),
-                    ),
-                zaxis = dict(
-                    showticklabels=False,
-                    showaxeslabels=False,
-                    nticks=5,
-                    range=[0,5],
-                    backgroundcolor="rgb(245,245,245)",
-                    title = dict(text=""),
+            ),
+        )
+
+        if 'data' in task:
+            changed = cubevalues > 0
+            for row, cubevalue in zip(all_cubes[changed].itertuples(), cubevalues[changed]):
+                # place the number on top of the cube
+                height = row.h if row.o == 'z' else .9
+                annotations.append(dict(
+                    x=row.x,
+                    y=row.y,
+                    z=height + 1,
+                    text=' ' + str(cubevalue) + ' ',
+                    showarrow=False,
+                    # bgcolor="rgba(255,255,255,.7)",
+                    font=dict(
+                        color="black",
+                        size=20
                     ),
-                annotations = annotations,
-                camera = dict(
-                    up=dict(x=0, y=0, z=1),
-                    # center=dict(x=-.4, y=-.4, z=-.7),
-                    # eye=dict(x=.7, y=.6, z=-.1),
-
-                    # This one worked well for non orthographic!
-                    # center=dict(x=3, y=2, z=0),
-                    # eye=dict(x=13, y=10, z=10),
-
-                    #  with perspective
-                    center=dict(x=0, y=0, z=-5),
-                    eye=dict(x=camera[0], y=camera[1], z=16),
-
-                    # orthographic
-                    # projection = dict(
-                    #     type="orthographic"
-                    # ),
-                    # center=dict(x=3, y=2, z=0),
-                    # eye=dict(x=35, y=30, z=30),
+                    )
                 )
+
+    fig.update_layout(
+        margin=dict(l=0, r=0, t=0, b=0),
+
+        scene = dict(
+            aspectratio=dict(
+             x=20,
+             y=20,
+             z=5,
             ),
-        )
+            xaxis = dict(
+                showticklabels=False,
+                # showaxeslabels=False,
+                nticks=40,
+                range=[0,20],
+                showbackground=False,
+                visible=True,
+                title = dict(text=""),
+                ),
+            yaxis = dict(
+                showticklabels=False,
+                # showaxeslabels=False,
+                nticks=40,
+                range=[0,20],
+                showbackground=False,
+                visible=True,
+                title = dict(text=""),
+                ),
+            zaxis = dict(
+                showticklabels=False,
+                showaxeslabels=False,
+                nticks=5,
+                range=[0,5],
+                backgroundcolor="rgb(245,245,245)",
+                title = dict(text=""),
+                ),
+            annotations = annotations,
+            camera = dict(
+                up=dict(x=0, y=0, z=1),
+                # center=dict(x=-.4, y=-.4, z=-.7),
+                # eye=dict(x=.7, y=.6, z=-.1),
+
+                # This one worked well for non orthographic!
+                # center=dict(x=3, y=2, z=0),
+                # eye=dict(x=13, y=10, z=10),
+
+                #  with perspective
+                center=dict(x=0, y=0, z=-5),
+                eye=dict(x=camera[0], y=camera[1], z=16),
+
+                # orthographic
+                # projection = dict(
+                #     type="orthographic"
+                # ),
+                # center=dict(x=3, y=2, z=0),
+                # eye=dict(x=35, y=30, z=30),
+            )
+        ),
+    )
 
 
-        # fig.show()
-        if 'baseline' in task:
-            fig.write_image(f"images/BASELINE physicalisation == {task['phys']}.jpg", width=600, height=400, scale=5)
-        elif 'data' in task:
-            fig.write_image(f"images/HEATMAP physicalisation == {task['phys']} and conditiond == 0-{task['data']}.jpg", width=600, height=400, scale=5)
-        else:
-            fig.write_image(f"images/{query} and conditions == {task['cond']}.jpg", width=600, height=400, scale=5)
+    # fig.show()
+    return fig, task_path(task)
+
 
+def task_path(task: dict) -> str:
+    # the image a task of printvis() is exported to
+    if 'baseline' in task:
+        return f"images/BASELINE physicalisation == {task['phys']}.jpg"
+    elif 'data' in task:
+        return f"images/HEATMAP physicalisation == {task['phys']} and conditiond == 0-{task['data']}.jpg"
+    else:
+        return f"images/{task_query(task)} and conditions == {task['cond']}.jpg"
 
 
-def display(frame: pd.DataFrame, participant: str, condition: str, orientation: str, physicalisation: str) -> None:
-    """Create 3D renderings of Data series
+@profiling.profiled('render key')
+def task_key(frame: pd.DataFrame, task: dict, data: list = None, trial: pd.DataFrame = None) -> str:
+    """Identifies everything that goes into the image of a task, so unchanged images need not be exported again
+    Args:
+        see task_figure()
+    Returns:
+        A hash of the selected rows, heatmap data, camera, colour scales and export settings of the task
+    """
+    if trial is None:
+        trial = task_trial(frame, task)
+    remove_cond = [x for x in [0,1,2] if x not in task['cond']]
+    target = trial.drop(remove_cond, level='condition')
+
+    key = hashlib.sha1()
+    key.update(json.dumps([
+        render_version, task, phys_angles.get(task['phys']), colorscale, datacolorscale, export_settings,
+    ], sort_keys=True, default=str).encode())
+    key.update(pd.util.hash_pandas_object(target, index=True).to_numpy().tobytes())
+    if 'data' in task:
+        heatmap = _heatmap(data, task)
+        key.update(json.dumps([heatmap.maximum, heatmap.row(task['phys']).tolist()], default=str).encode())
+    return key.hexdigest()
+
+
+def _load_render_cache(folder: str = "images") -> dict:
+    # the keys of the images exported before, by their path
+    try:
+        return json.loads((Path(folder) / 'render_cache.json').read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_render_cache(cache: dict, folder: str = "images") -> None:
+    (Path(folder) / 'render_cache.json').write_text(json.dumps(cache, indent=1, sort_keys=True))
+
+
+def _export_trial(trial: pd.DataFrame, tasks: list, data: list = None) -> list:
+    """Renders the tasks of one trial, and exports these as images
+    The cubes of the trial are turned into a mesh once, and shared by all of its tasks
     Args:
-        frame: the data frame storing data to be rendered
+        trial: the rows of the trial
+        tasks: the tasks showing this trial
+        data: the heatmap data, for tasks with a 'data' key
+    Returns:
+        A list of (task, error) tuples, where the error is None for exported tasks
+    """
+    geometry = {condition: cubes_geometry(cubes, print_width, print_height) for condition, cubes in trial.groupby('condition')}
+
+    results = []
+    for task in tasks:
+        try:
+            fig, path = task_figure(None, task, data, trial=trial, geometry=geometry)
+            with profiling.stage('export image'):
+                fig.write_image(path, **export_settings)
+            results.append((task, None))
+        except Exception as e:
+            results.append((task, e))
+    return results
+
+
+# the heatmap data of a worker process of printvis(), sent once when the process starts
+_worker = {}
+
+
+def _start_worker(data: list) -> None:
+    import plotly.graph_objects as plot
+
+    _worker['data'] = data
+    # start kaleido once, rather than on the first task of this process
+    try:
+        plot.Figure().to_image(format='jpg', width=10, height=10)
+    except Exception:
+        pass
+
+
+def _export_trial_in_worker(trial: pd.DataFrame, tasks: list) -> list:
+    return _export_trial(trial, tasks, _worker['data'])
+
+
+def printvis(frame: pd.DataFrame, tasks: list, data:list = None, jobs: int = 1, cache: bool = True) -> None:
+    """save 3D renderings of Data series
+    Tasks are grouped per trial, so each trial is selected from the frame only once.
+    A failing task is reported, after which the other tasks continue
+    Args:
+        frame: the data frame storing data to be rendered, or a Dataset of it
+        tasks: the trials and conditions to render, see task_figure()
+        data: the heatmap data, for tasks with a 'data' key
+        jobs: the number of processes rendering and exporting images in parallel, defaults to 1
+        cache: if true, skips tasks of which the image was already exported from the very same data and settings
     Returns:
         nothing
     """
-    situation = f"Phys{physicalisation}_P{participant}_Condition{condition}_{orientation}"
 
-    if not isinstance(frame, pd.DataFrame):
-        raise TypeError(f"Argument dataframe must be of type pandas DataFrame, not {type(save)}")
+    print("Generating visuals for")
+    failed = 0
+
+    # index the trials once, so selecting the rows of a trial takes no time
+    if not isinstance(frame, Dataset):
+        frame = Dataset.from_frame(frame)
+    # arrange the heatmap data once, so the values of all cubes are looked up at once
+    if data is not None:
+        data = [heatmap if isinstance(heatmap, Heatmap) else Heatmap.from_frame(heatmap) for heatmap in data]
+
+    # group the tasks by trial, and select the rows of each trial once
+    trials = {}
+    for task in tasks:
+        trials.setdefault((task['phys'], task['part'], task['view']), []).append(task)
+    rows = {trial: task_trial(frame, trial_tasks[0]) for trial, trial_tasks in trials.items()}
+
+    # also without skipping, so the entries of the images that are not exported again are kept
+    rendered = _load_render_cache()
+    keys = {}
+    for trial, trial_tasks in trials.items():
+        for task in trial_tasks:
+            try:
+                keys[task_path(task)] = task_key(frame, task, data, trial=rows[trial])
+            except Exception:
+                # let the rendering report the error of this task
+                continue
+
+    def _unchanged(task):
+        path = task_path(task)
+        return cache and path in keys and rendered.get(path) == keys[path] and Path(path).exists()
+
+    skipped = sum(_unchanged(task) for task in tasks)
+    if skipped > 0:
+        print(f"Skipping {skipped} visuals of which the data and settings have not changed")
+        trials = {trial: [task for task in trial_tasks if not _unchanged(task)] for trial, trial_tasks in trials.items()}
+        trials = {trial: trial_tasks for trial, trial_tasks in trials.items() if len(trial_tasks) > 0}
+    total = sum(len(trial_tasks) for trial_tasks in trials.values())
+
+    def _done(task, e, write=print):
+        nonlocal failed
+        if e is not None:
+            failed += 1
+            write(f"An error occured in rendering {task}: {e}")
+        else:
+            write(' - ' + task_query(task) + f" and conditions == {task['cond']}")
+            # remember the key of an exported image, straight away so an interrupted run keeps these too
+            if task_path(task) in keys:
+                rendered[task_path(task)] = keys[task_path(task)]
+                _save_render_cache(rendered)
+
+    if jobs > 1 and len(trials) > 1:
+        # each process gets its own kaleido, and renders all tasks of a trial
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_start_worker, initargs=(data,)) as executor:
+            futures = {executor.submit(_export_trial_in_worker, rows[trial], trial_tasks): trial_tasks for trial, trial_tasks in trials.items()}
+            with tqdm(total=total) as progress:
+                for future in as_completed(futures):
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        results = [(task, e) for task in futures[future]]
+                    for task, e in results:
+                        _done(task, e, write=tqdm.write)
+                    progress.update(len(results))
     else:
-        # get the specific index from the dataframe
-        vis = frame.loc[(int(participant), int(physicalisation), orientation, int(condition))]
-        print(vis)
+        for trial, trial_tasks in trials.items():
+            for task, e in _export_trial(rows[trial], trial_tasks, data):
+                _done(task, e)
 
-        # eight x, y, and z coordinates form a cube
-        # reference: https://plotly.com/python/reference/isosurface/
+    if failed:
+        print(f"{failed} of {total} visuals could not be generated")
 
-        fig= plot.Figure(
-            layout_title_text=situation
-        )
 
-        # numbers hovering over cubes
-        annotations = []
+def display_figure(frame: pd.DataFrame, participant: str, condition: str, orientation: str, physicalisation: str) -> tuple:
+    """Create the 3D rendering of one condition of a trial, as shown by display()
+    Args:
+        frame: the data frame storing data to be rendered, or a Dataset of it
+    Returns:
+        A tuple of the plotly figure, and the rows of the cubes it shows
+    """
+    situation = f"Phys{physicalisation}_P{participant}_Condition{condition}_{orientation}"
 
-        for row in vis.itertuples():
-            c = {
-                # coordinates
-                'x' : row.x,
-                'y' : row.y,
-                'z' : 1,
-                # half widths
-                'wx' : .5,
-                'wy' : .5,
-                # heigth
-                'wz' : 1,
-            }
-            # overrule widths based on orientation
-            # note that a orientation in y, adds width to the 'x' direction - and vise versa
-            c['w' + row.o] = row.h / (1 if row.o == 'z' else 2)
-
-            fig.add_trace(
-                plot.Isosurface(
-                    x=[c['x']-c['wy'], c['x']-c['wy'], c['x']-c['wy'], c['x']-c['wy'], c['x']+c['wy'], c['x']+c['wy'], c['x']+c['wy'], c['x']+c['wy']],
-                    y=[c['y']+c['wx'], c['y']-c['wx'], c['y']+c['wx'], c['y']-c['wx'], c['y']+c['wx'], c['y']-c['wx'], c['y']+c['wx'], c['y']-c['wx']],
-                    z=[c['wz'],     c['wz'],     0,        0,        c['wz'],     c['wz'],     0,        0],
-                    value=[row.g]*8,
-                    hoverinfo="none",
-                    showscale=False,
-                    opacity=1.0,
-                    contour=dict(
-                        show=True
-                        ),
-                    isomin=1,
-                    isomax=5,
-                    ),
-            )
+    if isinstance(frame, pd.DataFrame):
+        frame = Dataset.from_frame(frame)
 
-            annotations.append(dict(
-                x=c['x'],
-                y=c['y'],
-                z=c['wz'] + .5,
-                text=str(row.Index),
-                showarrow=False,
-                bgcolor="rgba(255,255,255,.7)",
-                font=dict(
-                    color="black",
-                    size=12
-                ),
-                )
-            )
+    if not isinstance(frame, Dataset):
+        raise TypeError(f"Argument dataframe must be of type pandas DataFrame or Dataset, not {type(frame)}")
 
-        fig.update_layout(
-            scene_aspectmode='cube',
-            scene = dict(
-                xaxis = dict(nticks=40, range=[0,20],showbackground=False),
-                yaxis = dict(nticks=40, range=[0,20],showbackground=False),
-                zaxis = dict(nticks=4, range=[0,20],),
-                xaxis_title='X AXIS TITLE',
-                yaxis_title='Y AXIS TITLE',
-                zaxis_title='Z AXIS TITLE',
-                annotations = annotations,
-            ),
-            scene_camera = dict(
-                eye=dict(x=0., y=2.5, z=0.)
+    # get the rows of the condition of the trial, indexed by cube
+    vis = frame.trial(int(physicalisation), int(participant), orientation).conditions([int(condition)]).frame()
+    vis = vis.droplevel([name for name in vis.index.names if name != 'cube'])
+
+    return _cubes_figure(vis, situation), vis
+
+
+def _cubes_figure(vis: pd.DataFrame, situation: str) -> 'plotly.graph_objects.Figure':
+    # the figure of display_figure(), of the rows of one condition of a trial, indexed by cube
+    import plotly.graph_objects as plot
+
+    fig= plot.Figure(
+        layout_title_text=situation
+    )
+
+    fig.add_trace(cubes_mesh(vis, vis['g'].to_numpy(dtype=float, na_value=np.nan), width=.5, height=1, opacity=1.0, cmin=1, cmax=5))
+
+    # numbers hovering over cubes
+    annotations = []
+
+    for row in vis.itertuples():
+        annotations.append(dict(
+            x=row.x,
+            y=row.y,
+            z=(row.h if row.o == 'z' else 1) + .5,
+            text=str(row.Index),
+            showarrow=False,
+            bgcolor="rgba(255,255,255,.7)",
+            font=dict(
+                color="black",
+                size=12
             ),
+            )
         )
 
-        # fig.write_html(f"output/{situation}.html")
-        fig.show()
+    fig.update_layout(
+        scene_aspectmode='cube',
+        scene = dict(
+            xaxis = dict(nticks=40, range=[0,20],showbackground=False),
+            yaxis = dict(nticks=40, range=[0,20],showbackground=False),
+            zaxis = dict(nticks=4, range=[0,20],),
+            xaxis_title='X AXIS TITLE',
+            yaxis_title='Y AXIS TITLE',
+            zaxis_title='Z AXIS TITLE',
+            annotations = annotations,
+        ),
+        scene_camera = dict(
+            eye=dict(x=0., y=2.5, z=0.)
+        ),
+    )
+    return fig
 
 
-def generate_large_csv(input: str = "input", output: str = "output", delimiter: str = ";", save: bool = False ) -> None:
-    """Concatenates all .csv files into a pandas MultiIndex Frame (i.e. Table).
-    Performs minor tweaks to the incoming data, e.g. coordinates and naming scheme
+def display(frame: pd.DataFrame, participant: str, condition: str, orientation: str, physicalisation: str) -> None:
+    """Create 3D renderings of Data series
     Args:
-        input: folder containing all .csv files
-        output: output folder to store any results in
-        delimiter: input files delimiter, defaults to ';'
-        save: if true, saves all concatenated .csv as a .csv in the output folder
+        frame: the data frame storing data to be rendered, or a Dataset of it
     Returns:
-        A dataframe with all concatenated input .csv data
+        nothing
     """
+    fig, vis = display_figure(frame, participant, condition, orientation, physicalisation)
+    print(vis)
 
-    # find all .csv files in the input folder recursively
-    all_files = list(Path(input).rglob('*.csv'));
+    # fig.write_html(f"output/{situation}.html")
+    fig.show()
+
+
+# change this whenever a change in display_figure() changes the exported pages, to export these again
+page_version = 1
+
+
+def page_name(physicalisation, participant, orientation, condition, format: str = 'html') -> str:
+    # the name of the exported page of one condition of a trial, like the name of its input .csv file
+    return f"P{participant}_{physicalisation}_{orientation}_{condition}.{format}"
 
-    li = []
 
-    for i, filename in enumerate(tqdm(all_files)):
-        ''' split the filename into columns
-        Expecting filesnames in the format PX_0_N_0
-            Participant = [P1-P20]
-            Phys = [1-6]
-            Orientation = [N, E, S, W]
-            Condition = [0-2]
-                0 = clustering
-                1 = single move
-                2 = multiple moves
-        '''
-        df1 = pd.read_csv(filename, index_col=None, header=0, delimiter=delimiter, keep_default_na=False)
-
-        # removed empty (or in our case unnamed) columns
-        df1 = df1.loc[:, ~df1.columns.str.contains('^Unnamed')]
+def _export_pages(rows: pd.DataFrame, trial: tuple, conditions: list, output: str, format: str) -> list:
+    """Writes the pages of the conditions of one trial
+    Args:
+        rows: the rows of the trial
+        trial: the (physicalisation, participant, orientation) of the trial
+        conditions: the conditions to write
+        output: the folder to write to
+        format: 'html', for pages using the plotly.min.js in the same folder, or 'json', for the figures only
+    Returns:
+        A list of (name, error) tuples, where the error is None for written pages
+    """
+    import plotly.io
 
+    physicalisation, participant, orientation = trial
+    results = []
+    for condition in conditions:
+        name = page_name(physicalisation, participant, orientation, condition, format)
         try:
-            # split the coordinates in two columns, and remove original
-            df1[['cube_x','cube_y']] = df1['coordinates'].str.split(pat=',',expand=True)
-            df1 = df1.drop(columns=['coordinates'])
+            with profiling.stage('page figure'):
+                vis = rows.xs(condition, level='condition')
+                vis = vis.droplevel([level for level in vis.index.names if level != 'cube'])
+                fig = _cubes_figure(vis, f"Phys{physicalisation}_P{participant}_Condition{condition}_{orientation}")
+            with profiling.stage('write page'):
+                if format == 'json':
+                    content = plotly.io.to_json(fig)
+                else:
+                    content = plotly.io.to_html(fig, include_plotlyjs='plotly.min.js', full_html=True)
+                (Path(output) / name).write_text(content, encoding='utf-8')
+            results.append((name, None))
+        except Exception as e:
+            results.append((name, e))
+    return results
+
+
+@profiling.profiled('write index')
+def _write_index(pages: dict, output: str, format: str) -> None:
+    # an index page linking to the pages of all trials, per physicalisation
+    lines = ['<!DOCTYPE html>', '<html>', '<head><meta charset="utf-8"><title>physvis</title></head>', '<body>']
+    for physicalisation in sorted({trial[0] for trial in pages}):
+        lines.append(f"<h2>Physicalisation {physicalisation}</h2>")
+        lines.append('<table>')
+        for trial in sorted(trial for trial in pages if trial[0] == physicalisation):
+            links = ' '.join(f'<a href="{page_name(*trial, condition, format)}">{condition}</a>' for condition in pages[trial])
+            lines.append(f"<tr><td>P{trial[1]}</td><td>{trial[2]}</td><td>{links}</td></tr>")
+        lines.append('</table>')
+    lines += ['</body>', '</html>']
+    (Path(output) / 'index.html').write_text("\n".join(lines), encoding='utf-8')
+
+
+@profiling.profiled('export')
+def exportvis(frame: pd.DataFrame, output: str = "html", format: str = "html", jobs: int = 1, cache: bool = True) -> None:
+    """Exports the 3D rendering of each condition of every trial, as shown by display(), and an index page
+    Every page uses one shared plotly.js in the output folder, rather than holding a copy of its own
+    Args:
+        frame: the data frame storing data to be rendered, or a Dataset of it
+        output: the folder to export to
+        format: 'html' for pages, or 'json' for the figures only (to load with Plotly.react)
+        jobs: the number of processes writing pages in parallel, defaults to 1
+        cache: if true, skips pages that were already exported from the very same data and settings
+    Returns:
+        nothing
+    """
+    import plotly
+    from plotly.offline import get_plotlyjs
+
+    if not isinstance(frame, Dataset):
+        frame = Dataset.from_frame(frame)
+    folder = helpers.create_output_folder(output)
+
+    # identify what goes into each page, and skip the pages that were exported from the same before
+    cache_file = folder / 'export_cache.json'
+    # also without skipping, so the entries of the pages that are not exported again are kept
+    exported = json.loads(cache_file.read_text()) if cache_file.exists() else {}
+    settings = json.dumps([page_version, plotly.__version__, format]).encode()
+
+    if not cache or exported.get('plotly.min.js') != plotly.__version__ or not (folder / 'plotly.min.js').exists():
+        (folder / 'plotly.min.js').write_text(get_plotlyjs(), encoding='utf-8')
+        exported['plotly.min.js'] = plotly.__version__
+
+    pages, work, keys = {}, [], {}
+    for trial in frame.trials():
+        rows = frame.trial(*trial).frame()
+        conditions = rows.index.get_level_values('condition').unique().tolist()
+        pages[trial] = conditions
+
+        todo = []
+        with profiling.stage('page key'):
+            for condition in conditions:
+                name = page_name(*trial, condition, format)
+                key = hashlib.sha1(settings)
+                key.update(pd.util.hash_pandas_object(rows.xs(condition, level='condition', drop_level=False)).to_numpy().tobytes())
+                keys[name] = key.hexdigest()
+                if not cache or exported.get(name) != keys[name] or not (folder / name).exists():
+                    todo.append(condition)
+        if todo:
+            work.append((rows, tuple(trial), todo))
+
+    total = sum(len(todo) for _, _, todo in work)
+    print(f"Exporting {total} of {sum(len(conditions) for conditions in pages.values())} pages to {folder}")
+
+    failed = 0
+
+    def _done(name, e, write=print):
+        nonlocal failed
+        if e is not None:
+            failed += 1
+            write(f"An error occured in exporting {name}: {e}")
+        else:
+            exported[name] = keys[name]
+
+    try:
+        if jobs > 1 and len(work) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = {executor.submit(_export_pages, rows, trial, todo, str(folder), format): (trial, todo) for rows, trial, todo in work}
+                with tqdm(total=total) as progress:
+                    for future in as_completed(futures):
+                        try:
+                            results = future.result()
+                        except Exception as e:
+                            trial, todo = futures[future]
+                            results = [(page_name(*trial, condition, format), e) for condition in todo]
+                        for name, e in results:
+                            _done(name, e, write=tqdm.write)
+                        progress.update(len(results))
+        else:
+            for rows, trial, todo in tqdm(work):
+                for name, e in _export_pages(rows, trial, todo, str(folder), format):
+                    _done(name, e, write=tqdm.write)
+    finally:
+        # remember the keys of the exported pages, also when interrupted
+        cache_file.write_text(json.dumps(exported, indent=1))
+
+    _write_index(pages, folder, format)
+    if failed:
+        print(f"{failed} of {total} pages could not be exported")
+    print(f"See {folder / 'index.html'} for all trials")
+
+
+@profiling.profiled('read trial csv')
+def _read_trial_csv(filename: Path, delimiter: str = ";") -> tuple:
+    """Reads one .csv file of a trial, and prepends the data from its filename to each row
+    Expecting filesnames in the format PX_0_N_0
+        Participant = [P1-P20]
+        Phys = [1-6]
+        Orientation = [N, E, S, W]
+        Condition = [0-2]
+            0 = clustering
+            1 = single move
+            2 = multiple moves
+    Args:
+        filename: the .csv file of the trial
+        delimiter: input files delimiter, defaults to ';'
+    Returns:
+        A tuple of the dataframe with the data of the trial (or None), and the error that occured (or None)
+    """
+    try:
+        return helpers.read_trial_csv(filename, delimiter), None
+    except (OSError, ValueError) as e:
+        return None, e
 
-            # multiply the filname data to match the amount of rows
-            df2 = pd.DataFrame([filename.stem.split(sep='_')]*len(df1.index) ,columns=helpers.naming_columns[:4])
 
-            # remove the 'P' before participant
-            df2['participant']= df2['participant'].str.lstrip('P')
+def _read_trial_csvs(all_files: list, delimiter: str = ";", jobs: int = 1):
+    """Reads the .csv files of trials, in a pool of processes if jobs > 1
+    Args:
+        all_files: the .csv files to read
+        delimiter: input files delimiter, defaults to ';'
+        jobs: the number of processes reading the .csv files in parallel, defaults to 1
+    Yields:
+        Tuples of (filename, dataframe, error) as returned by _read_trial_csv(), in the order of the files
+    """
+    if jobs > 1 and len(all_files) > 1:
+        # read the files in a pool of processes, keeping the order of the files
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(_read_trial_csv, all_files, repeat(delimiter), chunksize=max(1, len(all_files) // (jobs * 8)))
+    else:
+        executor = None
+        results = map(_read_trial_csv, all_files, repeat(delimiter))
+
+    try:
+        for (df_joined, e), filename in zip(tqdm(results, total=len(all_files)), all_files):
+            if e is not None:
+                print(f"An '{e}' error occured in one of the files: {filename}")
+            yield filename, df_joined, e
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def _encode(values: np.ndarray, known: dict) -> np.ndarray:
+    # give each distinct value a code, which stays the same over all chunks of a streaming collect()
+    codes, uniques = pd.factorize(values)
+    for value in uniques:
+        known.setdefault(value, len(known))
+    lookup = np.array([known[value] for value in uniques], dtype=np.int32)
+    return lookup[codes]
+
+
+@profiling.profiled('collect (streaming)')
+def _stream_large_csv(all_files: list, spill: Path, delimiter: str = ";", jobs: int = 1, chunk_size: int = 500) -> pd.DataFrame:
+    """Reads the .csv files of trials in chunks, and combines them into the frame generate_large_csv() creates
+    Rather than holding all files in memory, each chunk is converted into numbers and codes and spilled to disk.
+    The complete index is only created at the end, by placing each row directly in the product of all index levels.
+    Args:
+        all_files: the .csv files to read
+        spill: a (temporary) folder to store the converted chunks in
+        delimiter: input files delimiter, defaults to ';'
+        jobs: the number of processes reading the .csv files in parallel, defaults to 1
+        chunk_size: the number of files to read before spilling them to disk, defaults to 500
+    Returns:
+        A dataframe with all concatenated input .csv data, or None if no file could be read
+    """
+    index_columns = helpers.naming_columns[:5]
+    numeric_columns = ['h', 'g', 'x', 'y']
+    # the codes of the index levels and orientations, in order of appearance
+    known = {column: {} for column in index_columns + ['o']}
+    dtypes = {column: [] for column in numeric_columns}
+    chunks = []
+
+    for start in range(0, len(all_files), chunk_size):
+        chunk_files = all_files[start:start + chunk_size]
+        li = [df_joined for _, df_joined, e in _read_trial_csvs(chunk_files, delimiter, jobs) if e is None]
+        if len(li) == 0:
+            continue
+        chunk = pd.concat(li, axis=0, ignore_index=True)
+        del li
+
+        arrays = {column: _encode(chunk[column].to_numpy(), known[column]) for column in index_columns + ['o']}
+        for column in numeric_columns:
+            # already numbers, as read by helpers.read_trial_csv()
+            arrays[column] = chunk[column].to_numpy()
+            dtypes[column].append(arrays[column].dtype)
+
+        path = spill / f"chunk_{len(chunks)}.npz"
+        np.savez(path, **arrays)
+        chunks.append(path)
+        del chunk, arrays
+
+    if len(chunks) == 0:
+        return None
+
+    # sort the index levels like set_index() would, and translate the codes of all chunks accordingly
+    levels = [sorted(known[column]) for column in index_columns]
+    remap = {}
+    for column, level in zip(index_columns, levels):
+        position = {value: i for i, value in enumerate(level)}
+        remap[column] = np.array([position[value] for value in known[column]], dtype=np.int64)
+    orientations = np.array(list(known['o']), dtype=object)
+
+    shape = tuple(len(level) for level in levels)
+    size = int(np.prod(shape))
+
+    # place each row in the product of all index levels, and fill the gaps with NaN (like reindex() does)
+    rows = sum(np.load(path)['h'].size for path in chunks)
+    missing = rows < size
+    columns = {}
+    for column in numeric_columns:
+        dtype = np.result_type(*dtypes[column], np.float64 if (missing or column in ['x', 'y']) else dtypes[column][0])
+        columns[column] = np.full(size, np.nan, dtype=dtype) if missing else np.empty(size, dtype=dtype)
+    columns['o'] = np.full(size, np.nan, dtype=object)
+    filled = np.zeros(size, dtype=bool)
+
+    for path in chunks:
+        with np.load(path) as arrays:
+            positions = np.ravel_multi_index([remap[column][arrays[column]] for column in index_columns], shape)
+            if filled[positions].any() or np.unique(positions).size != positions.size:
+                raise ValueError("cannot reindex from a duplicate axis, some trials have been recorded more than once")
+            filled[positions] = True
+            for column in numeric_columns:
+                columns[column][positions] = arrays[column]
+            columns['o'][positions] = orientations[arrays['o']]
+
+    # correct the .5 x .5 offset in the data
+    columns['x'] -= .5
+    columns['y'] -= .5
+
+    index = pd.MultiIndex.from_product(levels, names=index_columns)
+    return pd.DataFrame({column: columns[column] for column in helpers.naming_columns[5:]}, index=index)
+
+
+# change this whenever a change in reading the .csv files of trials changes the rows collected, to read all files again
+collect_version = 2
+
+
+def _load_collected(input: str, output: str, delimiter: str) -> tuple:
+    """Loads the manifest and the rows of the files ingested by a previous collect()
+    Args:
+        input: folder containing all .csv files
+        output: output folder the previous collect() stored its results in
+        delimiter: input files delimiter
+    Returns:
+        A tuple of the manifest ({file: fingerprint}) and a dataframe of the collected rows (or None)
+    """
+    manifest_path = Path(output) / 'manifest.json'
+    store_path = Path(output) / 'collected.pkl'
+    if not manifest_path.exists() or not store_path.exists():
+        return {}, None
+
+    try:
+        manifest = json.loads(manifest_path.read_text())
+        # only continue from a previous collect() of the same input, read in the same way
+        if manifest.get('input') != str(Path(input).resolve()) or manifest.get('delimiter') != delimiter or manifest.get('version', 1) != collect_version:
+            return {}, None
+        return manifest['files'], pd.read_pickle(store_path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not use the results of the previous collect in {output}, collecting all files instead: {e}")
+        return {}, None
+
+
+def _save_collected(input: str, output: str, delimiter: str, files: dict, collected: pd.DataFrame) -> None:
+    # store the rows per file before combining them, so a next collect() can replace those of single files
+    folder = helpers.create_output_folder(output)
+    collected.to_pickle(folder / 'collected.pkl')
+    manifest = {'input': str(Path(input).resolve()), 'delimiter': delimiter, 'version': collect_version, 'files': files}
+    (folder / 'manifest.json').write_text(json.dumps(manifest, indent=1))
+
+
+@profiling.profiled('collect')
+def _combine_large_csv(all_files: list, input: str = "input", output: str = "output", delimiter: str = ";", save: bool = False, jobs: int = 1, incremental: bool = True) -> pd.DataFrame:
+    """Reads the .csv files of trials (or only those changed since the previous collect), and combines them in memory
+    Args:
+        all_files: the .csv files to read
+        see generate_large_csv() for the others
+    Returns:
+        A dataframe with all concatenated input .csv data, or None if no file could be read
+    """
+
+    # files are identified by their location in the input folder
+    names = [filename.relative_to(input).as_posix() for filename in all_files]
+
+    previous, collected = _load_collected(input, output, delimiter) if (save and incremental) else ({}, None)
+    files = {}
+    to_read = []
+
+    for filename, name in zip(all_files, names):
+        if name in previous:
+            # skip hashing when the file was not touched at all
+            known = previous[name]
+            current = helpers.fingerprint(filename, digest=False)
+            if (current['size'], current['mtime']) == (known['size'], known['mtime']):
+                files[name] = known
+                continue
+            current = helpers.fingerprint(filename)
+            if current['sha1'] == known['sha1']:
+                files[name] = current
+                continue
+        to_read.append((filename, name))
 
-            # prepend the data from the file name to each row of the data
-            df_joined = pd.concat([df2,df1],axis=1)
+    li = []
 
-            # adjust header names for easy reading
-            df_joined.columns = helpers.naming_columns
-            # add to bigger dataframe
+    if collected is not None:
+        # keep the rows of all unchanged files, drops those of changed or deleted files
+        dropped = len(set(previous) - set(files))
+        print(f"Reading {len(to_read)} new or changed files, removing the rows of {dropped} changed or deleted files")
+        li.append(collected[collected['file'].isin(files.keys())])
+
+    to_read = dict(to_read)
+    for filename, df_joined, e in _read_trial_csvs(list(to_read), delimiter, jobs):
+        if e is None:
+            # add to bigger dataframe, remembering which file the rows came from
+            name = to_read[filename]
+            df_joined['file'] = name
             li.append(df_joined)
+            files[name] = helpers.fingerprint(filename)
 
-        except Exception as e:
-            print(f"An '{e}' error occured in one of the files: {filename}")
+    if save:
+        collected = pd.concat(li, axis=0, ignore_index=True) if len(li) > 0 else pd.DataFrame(columns=helpers.naming_columns + ['file'])
+        collected['file'] = collected['file'].astype('category')
+        _save_collected(input, output, delimiter, files, collected)
+        li = [collected] if len(collected.index) > 0 else []
 
+    li = [df.drop(columns=['file']) for df in li]
 
-    if len(li) > 0:
-        # combine all arrays into a DataFrame, and convert to numbers where possible
-        frame = pd.concat(li, axis=0, ignore_index=True).set_index(helpers.naming_columns[:5]).sort_index()
-        frame = frame.apply(pd.to_numeric, errors='ignore')
+    if len(li) == 0:
+        return None
 
-        # correct the .5 x .5 offset in the data
-        frame.x = frame.x - .5
-        frame.y = frame.y - .5
+    # combine all arrays into a DataFrame (of which the columns are numbers already, see helpers.read_trial_csv())
+    frame = pd.concat(li, axis=0, ignore_index=True).set_index(helpers.naming_columns[:5]).sort_index()
 
-        frame.sort_index()
+    # correct the .5 x .5 offset in the data
+    frame.x = frame.x - .5
+    frame.y = frame.y - .5
 
-        # fill in the missing values, following https://stackoverflow.com/a/41274715/7053198
-        # creates floats, but ensures presence of all rows/columns
-        new_index = pd.MultiIndex.from_product(frame.index.levels)
-        frame = frame.reindex(new_index)
+    frame.sort_index()
 
-        print(frame.info())
+    # fill in the missing values, following https://stackoverflow.com/a/41274715/7053198
+    # creates floats, but ensures presence of all rows/columns
+    new_index = pd.MultiIndex.from_product(frame.index.levels)
+    frame = frame.reindex(new_index)
 
+    return frame
+
+
+def _report_peak_memory() -> None:
+    # the resource module is not available on Windows
+    try:
+        import resource
+    except ImportError:
+        return
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # in kilobytes on Linux, but in bytes on macOS
+    peak = peak / 1024 if sys.platform != 'darwin' else peak / 1024 ** 2
+    print(f"Peak memory use: {peak:.0f} MB")
+
+
+def generate_large_csv(input: str = "input", output: str = "output", delimiter: str = ";", save: bool = False, jobs: int = 1, incremental: bool = True, chunk_size: int = None, study: str = None) -> None:
+    """Concatenates all .csv files into a pandas MultiIndex Frame (i.e. Table).
+    Performs minor tweaks to the incoming data, e.g. coordinates and naming scheme
+    Args:
+        input: folder containing all .csv files
+        output: output folder to store any results in
+        delimiter: input files delimiter, defaults to ';'
+        save: if true, saves all concatenated .csv as a .csv in the output folder
+        jobs: the number of processes reading the .csv files in parallel, defaults to 1
+        incremental: if true (and saving), only reads the files that were added or changed since the previous collect()
+            otherwise, reads all files again
+        chunk_size: if given, streams all files in chunks of this many files, to limit the memory used
+            (this always reads all files, and leaves the results of a previous incremental collect() as-is)
+        study: the name to store the data under in the partitioned store (if saving), defaults to the name of the input folder
+    Returns:
+        A dataframe with all concatenated input .csv data
+    """
+
+    # find all .csv files in the input folder recursively
+    all_files = list(Path(input).rglob('*.csv'));
+
+    if chunk_size:
+        with tempfile.TemporaryDirectory(dir=helpers.create_output_folder(output)) as spill:
+            frame = _stream_large_csv(all_files, Path(spill), delimiter=delimiter, jobs=jobs, chunk_size=chunk_size)
+        _report_peak_memory()
+    else:
+        frame = _combine_large_csv(all_files, input=input, output=output, delimiter=delimiter, save=save, jobs=jobs, incremental=incremental)
+
+    if frame is not None:
         if save:
-            frame.to_csv(path_or_buf=helpers.create_output_folder(output) / 'combined.csv', sep=';', header=True)
+            path = helpers.create_output_folder(output) / 'combined.csv'
+            with profiling.stage('write csv'):
+                frame.to_csv(path_or_buf=path, sep=';', header=True)
+            # store a typed, binary copy next to it, partitioned by study and physicalisation, which helpers.get_collected()
+            # loads instead of the .csv (or only part of it)
+            study = study or Path(input).resolve().name
+            written = helpers.save_store(frame, helpers.store_path(path), study, source=path)
+            print(f"Stored {written} physicalisation(s) of study '{study}' in {helpers.store_path(path)}")
+
+        frame = helpers.compact_frame(frame)
+        print(frame.info())
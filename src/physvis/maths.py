@@ -1,17 +1,247 @@
+import itertools
+
 import numpy as np
-from decimal import Decimal, ROUND_HALF_EVEN, DecimalException, InvalidOperation
+from decimal import Decimal, ROUND_HALF_EVEN
 
 import pandas as pd
-from tqdm import tqdm
-import plotly.express as px
 
 from .helpers import naming_columns as nc
-from . import helpers
+from . import helpers, profiling
+from .dataset import Dataset
+
+
+# the phases compared by the calculations, as (before, after) conditions
+phases = {'0-1': (0, 1), '1-2': (1, 2), '0-2': (0, 2)}
+
+
+@profiling.profiled()
+def _condition_arrays(frame: pd.DataFrame, columns: list) -> tuple:
+    """Reshapes the frame once into (trial, cube, condition) arrays
+    Args:
+        frame: the data frame as loaded by helpers.get_large_csv(), or a Dataset of it
+        columns: the columns to reshape, e.g. ['o','x','y']
+    Returns:
+        The (physicalisation, participant, orientation, cube) index of the rows, and a dict with a
+        (rows, conditions) array per column. As collect() fills in all missing rows, each trial
+        holds the same amount of cubes, so these reshape to (trial, cube, condition) without copying
+    """
+    if isinstance(frame, Dataset):
+        return frame.condition_arrays(columns)
+    wide = frame[columns].unstack('condition')
+    wide = wide.reorder_levels(['physicalisation', 'participant', 'orientation', 'cube']).sort_index()
+    return wide.index, {column: wide[column].to_numpy() for column in columns}
+
+
+def _save_csv(table: pd.DataFrame, filename: str) -> None:
+    # save a result in the output folder
+    with profiling.stage('write csv'):
+        table.to_csv(path_or_buf=helpers.create_output_folder('output') / filename, sep=';', header=True)
+
+
+def _changed(before: np.ndarray, after: np.ndarray) -> np.ndarray:
+    # like Series.equals(), missing values in the same place are considered equal
+    return ~((before == after) | (pd.isna(before) & pd.isna(after)))
+
 
+@profiling.profiled()
+def _phase_changes(frame: pd.DataFrame) -> pd.DataFrame:
+    """Flags, for every cube in every trial, which changes occured in each phase
+    Args:
+        frame: the data frame as loaded by helpers.get_large_csv()
+    Returns:
+        A dataframe of 0/1 flags, indexed per cube in each trial, with ('type', 'phase') columns
+    """
+    index, arrays = _condition_arrays(frame, ['o', 'x', 'y'])
+    o, x, y = arrays['o'], arrays['x'].astype(float), arrays['y'].astype(float)
+
+    # orientations per condition. Note that the original checks, e.g. `o in ('z')`, test for a substring,
+    # so an empty (i.e. missing) orientation matches 'x', 'y' and 'z' - kept as-is to keep results equal
+    missing = (o == '')
+    is_xy = (o == 'x') | (o == 'y')
+    is_x, is_y, is_z = (o == 'x') | missing, (o == 'y') | missing, (o == 'z') | missing
+
+    flags = {}
+    for phase, (b, a) in phases.items():
+        orient = (o[:, b] != o[:, a])
+        prox = _changed(x[:, b], x[:, a]) | _changed(y[:, b], y[:, a])
+        flags[('total', phase)] = _changed(o[:, b], o[:, a]) | prox
+        flags[('a_orient', phase)] = orient
+        flags[('prox', phase)] = prox
+        flags[('xy->z', phase)] = is_xy[:, b] & is_z[:, a]
+        flags[('z->xy', phase)] = is_z[:, b] & is_xy[:, a]
+        flags[('x<->y', phase)] = (is_x[:, b] & is_y[:, a]) | (is_y[:, b] & is_x[:, a])
+
+    result = pd.DataFrame({key: value.astype('int64') for key, value in flags.items()}, index=index)
+    result.columns.names = ['type', 'phase']
+    return result
+
+
+def _changes_per_trial(frame: pd.DataFrame, types: list) -> pd.DataFrame:
+    # sum the flags of the chosen types per trial (i.e. ignore cube IDs), as rows of (trial, type) and columns of phases
+    changes = _phase_changes(frame)[types]
+    return changes.groupby(['physicalisation', 'participant', 'orientation']).sum().stack('type')
+
+def _round_hundredths(values: np.ndarray, exact=None) -> np.ndarray:
+    """Rounds off to two decimals, half to even, like Decimal(value).quantize(Decimal('.01')) does
+    Args:
+        values: an array of numbers
+        exact: optionally, a function returning a more precise number for the position of a value close to a tie
+    Returns:
+        An array of the rounded numbers, in hundredths (NaN and inf stay as they are)
+    """
+    values = np.array(values, dtype=float)
+    scaled = values * 100
+    rounded = np.rint(scaled)
+    with np.errstate(invalid='ignore'):
+        close = np.abs(scaled - np.floor(scaled) - .5) < 1e-6
+
+    # the multiplication (or the calculation of the value) may push a value close to a tie to the other side, use Decimal for those
+    for i in zip(*np.nonzero(close)):
+        value = exact(*i) if exact is not None else values[i]
+        rounded[i] = int(Decimal(value).quantize(Decimal('.01'), rounding=ROUND_HALF_EVEN).scaleb(2))
+    return rounded
 
-# initiate tqdm pandas methods
-tqdm.pandas()
 
+def _per_participant_array(per_participant: pd.DataFrame) -> tuple:
+    """Arranges results per (physicalisation, participant) as a (participant, physicalisation, column) array
+    Returns:
+        A tuple of the array (NaN where a participant has no results for a physicalisation), and the physicalisations
+    """
+    phys, participants = (per_participant.index.get_level_values(level) for level in ['physicalisation', 'participant'])
+    phys_codes, phys_levels = pd.factorize(phys, sort=True)
+    participant_codes, participant_levels = pd.factorize(participants, sort=True)
+    values = np.full((len(participant_levels), len(phys_levels), per_participant.shape[1]), np.nan)
+    values[participant_codes, phys_codes] = per_participant.to_numpy(dtype=float, na_value=np.nan)
+    return values, phys_levels
+
+
+def _resampled_statistics(values: np.ndarray, means: np.ndarray, resamples: int, seed) -> np.ndarray:
+    """Resamples the participants (with replacement) and calculates the statistics of each resample
+    Args:
+        values: a (participant, physicalisation, column) array of the results of each participant, NaN where missing
+        means: a boolean array, True for the columns of which the mean is taken rather than the sum
+        resamples: the number of resamples
+        seed: the seed (or SeedSequence) of the random generator
+    Returns:
+        A (resample, physicalisation + total, column) array of the statistics
+    """
+    participants = values.shape[0]
+    # the number of times each participant is drawn in each resample
+    weights = np.random.default_rng(seed).multinomial(participants, np.full(participants, 1 / participants), size=resamples).astype(float)
+    sums = np.einsum('bn,npc->bpc', weights, np.nan_to_num(values))
+    counts = np.einsum('bn,npc->bpc', weights, (~np.isnan(values)).astype(float))
+    sums = np.concatenate([sums, sums.sum(axis=1, keepdims=True)], axis=1)
+    counts = np.concatenate([counts, counts.sum(axis=1, keepdims=True)], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(means, sums / counts, sums)
+
+
+def _bootstrap(per_participant: pd.DataFrame, per_phys: pd.DataFrame, resamples: int, seed: int = 0, jobs: int = 1,
+               means=(), confidence: float = .95, chunk_size: int = 1000) -> pd.DataFrame:
+    """Adds bootstrapped confidence intervals to a table of results per physicalisation (with a total row),
+    by resampling the participants of the per participant results
+    Args:
+        per_participant: the results per (physicalisation, participant)
+        per_phys: the results per physicalisation, the sum (or mean) of the results of its participants
+        resamples: the number of resamples, e.g. 10000
+        seed: the seed of the resamples, so the intervals are the same each time (whatever the number of jobs)
+        jobs: the number of processes resampling in parallel, defaults to 1
+        means: the columns of which the mean is taken rather than the sum
+        confidence: the confidence level of the intervals
+        chunk_size: the number of resamples per chunk, each drawn with a seed of its own
+    Returns:
+        per_phys, with two columns after each column for the lower and upper bound of its interval, e.g. '0-1 2.5%' and '0-1 97.5%'
+    """
+    values, phys_levels = _per_participant_array(per_participant)
+    means = per_participant.columns.isin(list(means))
+
+    chunks = [min(chunk_size, resamples - start) for start in range(0, resamples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    if jobs > 1 and len(chunks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            statistics = list(executor.map(_resampled_statistics, *zip(*[(values, means, size, chunk_seed) for size, chunk_seed in zip(chunks, seeds)])))
+    else:
+        statistics = [_resampled_statistics(values, means, size, chunk_seed) for size, chunk_seed in zip(chunks, seeds)]
+
+    tail = (1 - confidence) / 2 * 100
+    with np.errstate(invalid='ignore'):
+        lower, upper = np.nanpercentile(np.concatenate(statistics), [tail, 100 - tail], axis=0)
+    rows = list(phys_levels) + ['total']
+    lower = pd.DataFrame(lower, index=rows, columns=per_participant.columns).reindex(index=per_phys.index, columns=per_phys.columns)
+    upper = pd.DataFrame(upper, index=rows, columns=per_participant.columns).reindex(index=per_phys.index, columns=per_phys.columns)
+
+    def _named(column, bound):
+        if isinstance(column, tuple):
+            return column[:-1] + (f"{column[-1]} {bound:g}%",)
+        return f"{column} {bound:g}%"
+
+    table = {}
+    for column in per_phys.columns:
+        table[column] = per_phys[column]
+        table[_named(column, tail)] = lower[column]
+        table[_named(column, 100 - tail)] = upper[column]
+    result = pd.DataFrame(table, index=per_phys.index)
+    result.columns.names = per_phys.columns.names
+    return result
+
+
+def _permutation_tests(per_participant: pd.DataFrame, permutations: int, seed: int = 0, chunk_size: int = 1000) -> pd.DataFrame:
+    """Calculates the p-values of two-sided permutation tests of results summed per physicalisation
+    The differences between phases are tested by swapping the phases of random participants, i.e. per physicalisation
+    (and in total) whether the sum of e.g. '0-1' differs from that of '1-2'. The differences between physicalisations
+    are tested by shuffling the physicalisations of each participant, i.e. whether the sums per physicalisation differ
+    more than by chance.
+    Args:
+        per_participant: the results per (physicalisation, participant)
+        permutations: the number of permutations, e.g. 100000
+        seed: the seed of the permutations, so the p-values are the same each time
+        chunk_size: the number of permutations calculated at once
+    Returns:
+        A table of p-values, with a 'p 0-1 vs 1-2' (etc.) column per type for the differences between phases per physicalisation
+        and in total (if the results have phases), and a 'p physicalisation' row of the differences between physicalisations per column
+    """
+    values, phys_levels = _per_participant_array(per_participant)
+    values = np.nan_to_num(values)
+    participants, physicalisations = values.shape[:2]
+    rng = np.random.default_rng(seed)
+    chunks = [min(chunk_size, permutations - start) for start in range(0, permutations, chunk_size)]
+    tables = []
+
+    # phases: the difference of two phases per participant (and in total), of which the sign is flipped at random
+    if 'phase' in (per_participant.columns.names or []):
+        contrasts = [(column_type, before, after) for column_type in per_participant.columns.unique('type')
+                     for before, after in itertools.combinations(per_participant[column_type].columns, 2)]
+        differences = np.stack([values[:, :, per_participant.columns.get_loc((column_type, after))] - values[:, :, per_participant.columns.get_loc((column_type, before))]
+                                for column_type, before, after in contrasts], axis=-1)
+        differences = np.concatenate([differences, differences.sum(axis=1, keepdims=True)], axis=1)
+        observed = np.abs(differences.sum(axis=0))
+        extreme = np.zeros_like(observed)
+        for size in chunks:
+            signs = rng.choice([-1., 1.], size=(size, participants))
+            extreme += (np.abs(np.einsum('bn,npk->bpk', signs, differences)) >= observed - 1e-9).sum(axis=0)
+        p_values = (extreme + 1) / (permutations + 1)
+
+        columns = pd.MultiIndex.from_tuples([(column_type, f"p {before} vs {after}") for column_type, before, after in contrasts], names=per_participant.columns.names)
+        tables.append(pd.DataFrame(p_values, index=pd.Index(list(phys_levels) + ['total'], name='physicalisation'), columns=columns))
+
+    # physicalisations: the spread of the sums per physicalisation, when the physicalisations of each participant are shuffled
+    observed = (values.sum(axis=0) ** 2).sum(axis=0)
+    extreme = np.zeros_like(observed)
+    for size in chunks:
+        order = np.argsort(rng.random((size, participants, physicalisations)), axis=2)
+        shuffled = np.take_along_axis(values[None], order[..., None], axis=2)
+        extreme += ((shuffled.sum(axis=1) ** 2).sum(axis=1) >= observed - 1e-9).sum(axis=0)
+    p_values = (extreme + 1) / (permutations + 1)
+    tables.append(pd.DataFrame([p_values], index=pd.Index(['p physicalisation'], name='physicalisation'), columns=per_participant.columns))
+    result = pd.concat(tables)
+    if isinstance(result.columns, pd.MultiIndex):
+        # keep the columns of each type together
+        result = result[[column for column_type in result.columns.unique('type') for column in result.columns if column[0] == column_type]]
+    return result
+
+
+@profiling.profiled()
 def changes_total_cubes(frame: pd.DataFrame) -> None:
     """Calculates various stats about the different moves participants made
     For 'standard' stats, see https://pandas.pydata.org/pandas-docs/stable/user_guide/groupby.html#aggregation
@@ -22,90 +252,47 @@ def changes_total_cubes(frame: pd.DataFrame) -> None:
         nothing
     """
 
-    # method local to this method
-    def _count_occurance_total_cube_changes(x):
-
-        def _check_per_cube(sub_x):
-            # return 1 if a change between row 2 and 0 occured, else 0
-            sub_x = sub_x.loc(axis=1)['o','x','y']  # drop other columns
-
-            return pd.Series(
-                [1 if not sub_x.iloc[0].equals(sub_x.iloc[2]) else 0,],
-                index=['changed'])
-
-        x_checked = x.groupby(['cube']).apply(_check_per_cube)  # per cube (3 rows of condition 0,1,2) check if there are changed
-        x_summed = x_checked.sum() # sum all the 1's over the cubed (i.e. how many were changed)
-        return x_summed
-
-
     # columns look like: ['participant','physicalisation','orientation','condition','cube', 'h', 'o', 'g', 'x', 'y']
 
-    # focus on each trial
-    conditions = frame.groupby(['physicalisation', 'participant', 'orientation'])
-    # calculate if changes occured and sum to how many, per trial
-    cubes_changed = conditions.progress_apply(_count_occurance_total_cube_changes)
+    # per cube check if a change between condition 0 and 2 occured, and sum to how many, per trial
+    cubes_changed = _changes_per_trial(frame, ['total']).xs('total', level='type')[['0-2']].rename(columns={'0-2': 'changed'})
     # count occurance of summed moves (e.g. 2x 16 cubes, 1x 3 cubes, etc)
     change_occurance = cubes_changed.groupby('physicalisation')['changed'].value_counts(sort=False)
     # make counted changes the header, and fill in the gaps with 0
     change_occurance_table = change_occurance.unstack(level='changed', fill_value=0)
     # save to file
-    change_occurance_table.to_csv(path_or_buf=helpers.create_output_folder('output') / f"count_if_change.csv", sep=';', header=True)
+    _save_csv(change_occurance_table, f"count_if_change.csv")
 
     return change_occurance_table
 
 
-def atomic_orientation_moved_occurance(frame: pd.DataFrame) -> None:
+@profiling.profiled()
+def atomic_orientation_moved_occurance(frame: pd.DataFrame, bootstrap: int = 0, permutations: int = 0, seed: int = 0, jobs: int = 1) -> None:
     # count any number of orientation changes > 0 as 1 in a trial
-    return atomic_orientation_moved_summed(frame, flatten=True)
+    return atomic_orientation_moved_summed(frame, flatten=True, bootstrap=bootstrap, permutations=permutations, seed=seed, jobs=jobs)
 
 
-def atomic_orientation_moved_summed(frame: pd.DataFrame, flatten=False) -> None:
+@profiling.profiled()
+def atomic_orientation_moved_summed(frame: pd.DataFrame, flatten=False, bootstrap: int = 0, permutations: int = 0, seed: int = 0, jobs: int = 1) -> None:
     """
     Args:
         frame: the data frame storing data to be rendered
+        bootstrap: the number of times participants are resampled, to add 95% confidence intervals to the results per physicalisation (0 adds none)
+        permutations: the number of permutations, to save the p-values of the differences between phases and physicalisations (0 saves none)
+        seed: the seed of the resampling and permutations
+        jobs: the number of processes resampling in parallel, defaults to 1
     Returns:
         nothing
     """
 
-    # method local to this method
-    def _chosen_cubes_to_change(x):
-        x = x.loc(axis=1)['o']  # drop other columns
-
-        resultframe = pd.DataFrame({
-            '0-1': {
-                'xy->z' : 1 if x.iloc[0] in ('x','y') and x.iloc[1] in ('z') else 0,
-                'z->xy' : 1 if x.iloc[0] in ('z') and x.iloc[1] in ('x','y') else 0,
-                'x<->y' : 1 if (x.iloc[0] in ('x') and x.iloc[1] in ('y')) or (x.iloc[0] in ('y') and x.iloc[1] in ('x')) else 0,
-            },
-            '1-2': {
-                'xy->z' : 1 if x.iloc[1] in ('x','y') and x.iloc[2] in ('z') else 0,
-                'z->xy' : 1 if x.iloc[1] in ('z') and x.iloc[2] in ('x','y') else 0,
-                'x<->y' : 1 if (x.iloc[1] in ('x') and x.iloc[2] in ('y')) or (x.iloc[1] in ('y') and x.iloc[2] in ('x')) else 0,
-            },
-            '0-2': {
-                'xy->z' : 1 if x.iloc[0] in ('x','y') and x.iloc[2] in ('z') else 0,
-                'z->xy' : 1 if x.iloc[0] in ('z') and x.iloc[2] in ('x','y') else 0,
-                'x<->y' : 1 if (x.iloc[0] in ('x') and x.iloc[2] in ('y')) or (x.iloc[0] in ('y') and x.iloc[2] in ('x')) else 0,
-            }
-
-        })
-        # give the subaxis a name
-        resultframe.rename_axis(index="type", columns="phase", inplace=True)
-        return resultframe
-
     # columns look like: ['participant','physicalisation','orientation','condition','cube', 'h', 'o', 'g', 'x', 'y']
 
-    # focus on each cube in each trial
-    conditions = frame.groupby(['physicalisation', 'participant', 'orientation', 'cube'])
-    # calculate if a cube was changed in the trial
-    cubes_changed = conditions.progress_apply(_chosen_cubes_to_change)
-    # sum orientation changes per trial (i.e. ignore cube IDs)
-
-    cubes_changed = cubes_changed.groupby(['physicalisation', 'participant','orientation','type']).sum()
+    # calculate if a cube was changed in the trial, and sum orientation changes per trial (i.e. ignore cube IDs)
+    cubes_changed = _changes_per_trial(frame, ['xy->z', 'z->xy', 'x<->y'])
     cubes_changed = cubes_changed.stack()
 
     if flatten:
-        cubes_changed = cubes_changed.apply(lambda x: np.min([1, x]))
+        cubes_changed = cubes_changed.clip(upper=1)
 
     # calculate averages of # of cubes changed per trial
     per_participant = cubes_changed.groupby(['physicalisation', 'participant', 'type','phase']).sum().unstack(level=['type','phase'])
@@ -114,6 +301,10 @@ def atomic_orientation_moved_summed(frame: pd.DataFrame, flatten=False) -> None:
     # add a total row
     per_phys.loc["total"] = per_phys.sum(axis=0)
 
+    # add confidence intervals, by resampling the participants
+    if bootstrap:
+        per_phys = _bootstrap(per_participant, per_phys, bootstrap, seed, jobs)
+
     with pd.option_context('display.max_rows', None, 'display.max_columns', None):  # more options can be specified also
         print(per_participant)
 
@@ -122,67 +313,46 @@ def atomic_orientation_moved_summed(frame: pd.DataFrame, flatten=False) -> None:
     if flatten:
         name="_occurances"
 
-    per_participant.to_csv(path_or_buf=helpers.create_output_folder('output') / f"atomic_orientation_changed_per_participant{name}.csv", sep=';', header=True)
-    per_phys.to_csv(path_or_buf=helpers.create_output_folder('output') / f"atomic_orientation_changed{name}.csv", sep=';', header=True)
+    _save_csv(per_participant, f"atomic_orientation_changed_per_participant{name}.csv")
+    _save_csv(per_phys, f"atomic_orientation_changed{name}.csv")
+
+    # test the differences between phases and physicalisations, and save the p-values next to the results
+    if permutations:
+        p_values = _permutation_tests(per_participant, permutations, seed)
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None):
+            print(p_values)
+        _save_csv(p_values, f"atomic_orientation_changed{name}_pvalues.csv")
 
     return per_phys
 
 
-def total_cubes_moved_occurance(frame: pd.DataFrame) -> None:
+@profiling.profiled()
+def total_cubes_moved_occurance(frame: pd.DataFrame, bootstrap: int = 0, permutations: int = 0, seed: int = 0, jobs: int = 1) -> None:
     # count any number of orientation changes > 0 as 1 in a trial
-    return total_cubes_moved(frame, flatten=True)
+    return total_cubes_moved(frame, flatten=True, bootstrap=bootstrap, permutations=permutations, seed=seed, jobs=jobs)
 
 
-def total_cubes_moved(frame: pd.DataFrame, flatten=False) -> None:
+@profiling.profiled()
+def total_cubes_moved(frame: pd.DataFrame, flatten=False, bootstrap: int = 0, permutations: int = 0, seed: int = 0, jobs: int = 1) -> None:
     """
     Args:
         frame: the data frame storing data to be rendered
+        bootstrap: the number of times participants are resampled, to add 95% confidence intervals to the results per physicalisation (0 adds none)
+        permutations: the number of permutations, to save the p-values of the differences between phases and physicalisations (0 saves none)
+        seed: the seed of the resampling and permutations
+        jobs: the number of processes resampling in parallel, defaults to 1
     Returns:
         nothing
     """
 
-    # method local to this method
-    def _chosen_cubes_to_change(x):
-        x = x.loc(axis=1)['o','x','y']  # drop other columns
-        yx = x.loc(axis=1)['x','y']  # drop other columns
-
-        resultframe = pd.DataFrame({
-            '0-1': {
-                'total' :    1 if not x.iloc[0].equals(x.iloc[1]) else 0,
-                'a_orient' : 1 if not x.iloc[0].o == x.iloc[1].o else 0,
-                'prox' :     1 if not yx.iloc[0].equals(yx.iloc[1]) else 0,
-            },
-            '1-2': {
-                'total' :    1 if not x.iloc[1].equals(x.iloc[2]) else 0,
-                'a_orient' : 1 if not x.iloc[1].o == (x.iloc[2].o) else 0,
-                'prox' :     1 if not yx.iloc[1].equals(yx.iloc[2]) else 0,
-            },
-            '0-2': {
-                'total' :    1 if not x.iloc[0].equals(x.iloc[2]) else 0,
-                'a_orient' : 1 if not x.iloc[0].o == (x.iloc[2].o) else 0,
-                'prox' :    1 if not yx.iloc[0].equals(yx.iloc[2]) else 0,
-            },
-
-
-        })
-        # give the subaxis a name
-        resultframe.rename_axis(index="type", columns="phase", inplace=True)
-        return resultframe
-
     # columns look like: ['participant','physicalisation','orientation','condition','cube', 'h', 'o', 'g', 'x', 'y']
 
-    # focus on each cube in each trial
-    conditions = frame.groupby(['physicalisation', 'participant', 'orientation', 'cube'])
-    # calculate if a cube was changed in the trial
-    cubes_changed = conditions.progress_apply(_chosen_cubes_to_change)
-
-    # sum orientation changes per trial (i.e. ignore cube IDs)
-
-    cubes_changed = cubes_changed.groupby(['physicalisation', 'participant','orientation','type']).sum()
+    # calculate if a cube was changed in the trial, and sum changes per trial (i.e. ignore cube IDs)
+    cubes_changed = _changes_per_trial(frame, ['total', 'a_orient', 'prox'])
     cubes_changed = cubes_changed.stack()
 
     if flatten:
-        cubes_changed = cubes_changed.apply(lambda x: np.min([1, x]))
+        cubes_changed = cubes_changed.clip(upper=1)
 
     # calculate averages of # of cubes changed per trial
     per_participant = cubes_changed.groupby(['physicalisation', 'participant', 'type','phase']).sum().unstack(level=['type','phase'])
@@ -192,6 +362,10 @@ def total_cubes_moved(frame: pd.DataFrame, flatten=False) -> None:
     # add a total row
     per_phys.loc["total"] = per_phys.sum(axis=0)
 
+    # add confidence intervals, by resampling the participants
+    if bootstrap:
+        per_phys = _bootstrap(per_participant, per_phys, bootstrap, seed, jobs)
+
     with pd.option_context('display.max_rows', None, 'display.max_columns', None):  # more options can be specified also
         print(per_participant)
 
@@ -201,12 +375,20 @@ def total_cubes_moved(frame: pd.DataFrame, flatten=False) -> None:
         name="_occurances"
 
     # save
-    per_participant.to_csv(path_or_buf=helpers.create_output_folder('output') / f"amount_cubes_changed__with_type_per_participant{name}.csv", sep=';', header=True)
-    per_phys.to_csv(path_or_buf=helpers.create_output_folder('output') / f"amount_cubes_changed_with_type{name}.csv", sep=';', header=True)
+    _save_csv(per_participant, f"amount_cubes_changed__with_type_per_participant{name}.csv")
+    _save_csv(per_phys, f"amount_cubes_changed_with_type{name}.csv")
+
+    # test the differences between phases and physicalisations, and save the p-values next to the results
+    if permutations:
+        p_values = _permutation_tests(per_participant, permutations, seed)
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None):
+            print(p_values)
+        _save_csv(p_values, f"amount_cubes_changed_with_type{name}_pvalues.csv")
 
     return per_phys
 
 
+@profiling.profiled()
 def IDs_cubes_moved(frame: pd.DataFrame) -> None:
     """
     Args:
@@ -215,26 +397,10 @@ def IDs_cubes_moved(frame: pd.DataFrame) -> None:
         nothing
     """
 
-    # method local to this method
-    def _chosen_cubes_to_change(x):
-        x = x.loc(axis=1)['o','x','y']  # drop other columns
-
-        return pd.Series(
-            [1 if not x.iloc[0].equals(x.iloc[1]) else 0,
-             1 if not x.iloc[0].equals(x.iloc[2]) else 0,
-             ],
-            index=[
-                '0-1',
-                '0-2',
-                ])
-
-
     # columns look like: ['participant','physicalisation','orientation','condition','cube', 'h', 'o', 'g', 'x', 'y']
 
-    # focus on each cube in each trial
-    conditions = frame.groupby(['physicalisation', 'participant', 'orientation', 'cube'])
     # calculate if a cube was changed in the trial
-    cubes_changed = conditions.progress_apply(_chosen_cubes_to_change)
+    cubes_changed = _phase_changes(frame)['total'][['0-1', '0-2']]
     # give the new values a name
     # cubes_changed.columns.name = 'any_change_at'
     # stack the horizontal 'headers' of 'any_change_at' back into a column, to perform the sum()
@@ -249,198 +415,352 @@ def IDs_cubes_moved(frame: pd.DataFrame) -> None:
         # put back the cube ID as headers
         tabular=summed_per_cube[columnname].unstack()
         # save to csv
-        tabular.to_csv(path_or_buf=helpers.create_output_folder('output') / f"IDs_changed_{columnname}.csv", sep=';', header=True)
+        _save_csv(tabular, f"IDs_changed_{columnname}.csv")
 
     return summed_per_cube.unstack()
 
     # plotting a grouped AND stacked bar chart: https://stackoverflow.com/questions/45055661/combine-grouped-and-stacked-bar-graph-in-r
 
 
-def proximity_changes_phase1(frame: pd.DataFrame) -> None:
-    return proximity_changes(frame, phase = 1, name='phase1')
+@profiling.profiled()
+def proximity_changes_phase1(frame: pd.DataFrame, bootstrap: int = 0, permutations: int = 0, seed: int = 0, jobs: int = 1) -> None:
+    return proximity_changes(frame, phase = 1, name='phase1', bootstrap=bootstrap, permutations=permutations, seed=seed, jobs=jobs)
 
 
-def proximity_changes(frame: pd.DataFrame, phase: int = 2, name: str = 'phase2') -> None:
+@profiling.profiled()
+def proximity_changes(frame: pd.DataFrame, phase: int = 2, name: str = 'phase2', bootstrap: int = 0, permutations: int = 0, seed: int = 0, jobs: int = 1) -> None:
     """
     Internal proximity = the average distance of all cluster's cubes to its centroid
     Internal proximity = the average distance of all cluster's centroids to it's closest neighbouring cluster
     This is the Davies-Bouldin index https://en.wikipedia.org/wiki/Davies%E2%80%93Bouldin_index
     how about silhouette? https://en.wikipedia.org/wiki/Silhouette_(clustering)
-    how
+    Both indices themselves are calculated by cluster_quality()
     Args:
-        frame: the data frame storing data to be rendered
+        frame: the data frame storing data to be rendered, or a Dataset of it
         phase: choose 1 or 2
+        bootstrap: the number of times participants are resampled, to add 95% confidence intervals to the results per physicalisation (0 adds none)
+        permutations: the number of permutations, to save the p-values of the differences between phases and physicalisations (0 saves none)
+        seed: the seed of the resampling and permutations
+        jobs: the number of processes resampling in parallel, defaults to 1
     Returns:
         nothing
     """
 
-    # method local to this method
-    def _centroids_distances(x):
-
-        def _check_per_group(group):
-
-            def _check_per_condition(cond):
-                # calculate the centroid
-                centroid = cond.mean()
-                # calculate mean distance to the centroid
-                mean_distance = np.nanmean(np.hypot((cond['x'] - centroid.x),(cond['y'] - centroid.y)))
-
-                return pd.Series([
-                    centroid.values.tolist(),
-                    mean_distance
-                    ],index=['centroid', 'distance'])
-
-            conditions = group.groupby(['condition']).apply(_check_per_condition)
-
-            if len(conditions) > phase:
-                # round off
-                try:
-                    distance_before = Decimal(conditions.iloc[0]['distance']).quantize(Decimal('.01'), rounding=ROUND_HALF_EVEN)
-                    distance_after = Decimal(conditions.iloc[phase]['distance']).quantize(Decimal('.01'), rounding=ROUND_HALF_EVEN)
-                except (ValueError, DecimalException, InvalidOperation) as e:
-                    print(conditions)
-
-                    print(f"error: {e}, caused in 1 {group.index}")
-
-                centroid_before = conditions.iloc[0]['centroid']
-                centroid_after = conditions.iloc[phase]['centroid']
-                internal_increase = 1 if distance_before < distance_after else 0
-                internal_decrease = 1 if distance_before > distance_after else 0
-                cluster_removed = 0
-            else:
-                centroid_before = conditions.iloc[0]['centroid']
-                centroid_after = [np.nan, np.nan]
-                distance_before = 0
-                distance_after = 0
-                internal_increase = 0
-                internal_decrease = 0
-                cluster_removed = 1
-
-            return pd.Series(
-                [centroid_before[0],
-                 centroid_before[1],
-                 centroid_after[0],
-                 centroid_after[1],
-                 distance_before,
-                 distance_after,
-                 internal_increase,
-                 internal_decrease,
-                 cluster_removed
-                 ],
-                index=['c_before_x','c_before_y', 'c_after_x','c_after_y', 'd_before', 'd_after', 'coh-', 'coh+','gone'])
-
-        def _check_seperation(group):
-            # calculate whether separation was increased or decreased
-            # for each centroid find closest neighbour and check if the distance was increased or decreased
-            seperation_increase = []
-            seperation_decrease = []
-            seperation_increase_only = []
-            seperation_decrease_only = []
-            seperation_both = []
-            # assuming no duplicates exist
-            # print(f"group = {group}")
-
-            if len(group) > 1:
-                for cluster in group.index.get_level_values('g'):
-                    # print(f"cluster = {cluster}")
-                    # print(group.loc[cluster].c_after_x)
-                    # print(np.sum(group.loc[cluster].c_after_x))
-                    # print(np.isnan(np.sum(group.loc[cluster].c_after_x)))
-
-                    # do not calculat different for a cluster that is removed - we just don't count that as a seperation+ or -
-                    if not np.isnan(np.sum(group.loc[cluster].c_before_x)) and not np.isnan(np.sum(group.loc[cluster].c_after_x)):
-                        before = [group.loc[cluster].c_before_x, group.loc[cluster].c_before_y]
-                        after = [group.loc[cluster].c_after_x, group.loc[cluster].c_after_y]
-
-                        # remove the cluster we are going to compare from the equation
-                        compare_to = group.drop(index=cluster)
-
-                        # remove any NaN for the comparison
-                        compare_to_before = compare_to.drop(columns=['c_after_x', 'c_after_y']).dropna()
-                        compare_to_after = compare_to.drop(columns=['c_before_x', 'c_before_y']).dropna()
-
-                        # calculate the smallest distance to any of the other centroids
-                        # min() on a series throws NaN if an NaN is present, but we should have removed these in the above code
-                        min_distance_before = np.hypot((compare_to_before.c_before_x - before[0]),(compare_to_before.c_before_y - before[1])).min()
-                        min_distance_after = np.hypot((compare_to_after.c_after_x - after[0]),(compare_to_after.c_after_y - after[1])).min()
-
-                        min_distance_before = Decimal(min_distance_before).quantize(Decimal('.01'), rounding=ROUND_HALF_EVEN)
-                        min_distance_after = Decimal(min_distance_after).quantize(Decimal('.01'), rounding=ROUND_HALF_EVEN)
-
-                        increase = 1 if min_distance_before < min_distance_after else 0
-                        decrease = 1 if min_distance_before > min_distance_after else 0
-                        seperation_increase.append(increase)
-                        seperation_decrease.append(decrease)
-                    else:
-                        seperation_increase.append(0)
-                        seperation_decrease.append(0)
-
-                return [seperation_increase, seperation_decrease]
-
-            else:
-                return [0, 0]
-
-        def _check_combos(x):
-            x['coh-only'] =  1 if x['coh-'] == 1 and x['coh+'] == 0 else 0
-            x['coh+only'] =  1 if x['coh-'] == 0 and x['coh+'] == 1 else 0
-            x['coh-+both'] = 1 if x['coh-'] == 1 and x['coh+'] == 1 else 0
-            x['sep-only'] =  1 if x['sep-'] == 1 and x['sep+'] == 0 else 0
-            x['sep+only'] =  1 if x['sep-'] == 0 and x['sep+'] == 1 else 0
-            x['sep-+both'] = 1 if x['sep-'] == 1 and x['sep+'] == 1 else 0
-            x['coh+&sep+'] = 1 if x['coh+'] == 1 and x['sep+'] == 1 else 0
-            x['coh+&no_sep+'] = 1 if x['coh+'] == 1 and x['sep+'] == 0 else 0
-            x['sep+&no_coh+'] = 1 if x['coh+'] == 0 and x['sep+'] == 1 else 0
-
-            return x
-
-
-        # per group and per condition ...
-
-        result = x.groupby(['g'])[['x','y']].apply(_check_per_group)
-
-        result['sep+'],result['sep-'] = _check_seperation(result)
-        result.drop(['c_before_x', 'c_before_y','c_after_x','c_after_y','d_before','d_after'], axis=1, inplace=True)
-        result = result.sum()
-
-        # if it occurered more than once in any group, just pen down 1 (thus the max of all of these become 80)
-        result = result.transform(lambda x: (1 if x > 0 else 0))
-        # check fr combinations of coh and sep
-        result = _check_combos(result)
-
-        return result
+    trial = ['physicalisation', 'participant', 'orientation']
+    cluster = trial + ['g']
 
+    # columns look like: ['participant','physicalisation','orientation','condition','cube', 'h', 'o', 'g', 'x', 'y']
 
+    # we want to check the cubes of each cluster, per condition, in each trial (ignoring cubes without a cluster)
+    if isinstance(frame, Dataset):
+        cubes = frame.cubes(['g', 'x', 'y'], where=~np.isnan(frame.g))
+        trials = frame.trials()
+    else:
+        cubes = frame[['g', 'x', 'y']].dropna(subset=['g']).astype({'x': float, 'y': float}).reset_index()
+        trials = frame.index.droplevel(['condition', 'cube']).reorder_levels(trial).unique().sort_values()
+    cubes = cubes.sort_values(cluster + ['condition', 'cube'], kind='mergesort', ignore_index=True)
+    conditions = cubes.groupby(cluster + ['condition'])
+
+    # calculate the centroids, and the mean distance of the cubes to their centroid
+    centroids = conditions[['x', 'y']].transform('mean')
+    cubes['distance'] = np.hypot(cubes['x'] - centroids['x'], cubes['y'] - centroids['y'])
+    per_condition = conditions.agg(c_x=('x', 'mean'), c_y=('y', 'mean'), distance=('distance', 'mean'))
+
+    # round off - a mean close to a tie is taken the same way as np.nanmean() does, so it is rounded the same
+    distances = cubes['distance'].to_numpy()
+    per_condition['distance'] = _round_hundredths(
+        per_condition['distance'].to_numpy(),
+        exact=lambda i: np.nanmean(distances[conditions.indices[per_condition.index[i]]]))
+    per_condition = per_condition.reset_index()
+
+    # compare the first condition a cluster appears in, with the condition it appears in at the chosen phase
+    # if a cluster does not appear in that many conditions, it is 'gone'
+    rank = per_condition.groupby(cluster).cumcount()
+    columns = ['c_x', 'c_y', 'distance']
+    clusters = per_condition.loc[rank == 0, cluster + columns].set_index(cluster)
+    clusters = clusters.join(per_condition.loc[rank == phase, cluster + columns].set_index(cluster), lsuffix='_before', rsuffix='_after')
+
+    gone = clusters['c_x_after'].isna().to_numpy()
+    d_before, d_after = clusters['distance_before'].to_numpy(), clusters['distance_after'].to_numpy()
+    clusters['coh-'] = ~gone & (d_before < d_after)
+    clusters['coh+'] = ~gone & (d_before > d_after)
+    clusters['gone'] = gone
+
+    # calculate whether separation was increased or decreased, for all clusters of all trials at once:
+    # for each centroid find the closest neighbouring centroid and check if the distance was increased or decreased
+    trial_id = clusters.groupby(trial).ngroup().to_numpy()
+    position = clusters.groupby(trial).cumcount().to_numpy()
+    size = (trial_id.max() + 1, position.max() + 1)
+
+    def _closest_neighbours(x, y):
+        # place the centroids in a (trial, cluster) grid, and compare each to all other centroids in the same trial
+        centroids = np.full(size + (2,), np.nan)
+        centroids[trial_id, position] = np.column_stack([x, y])
+        distance = np.hypot(*np.moveaxis(centroids[:, None, :, :] - centroids[:, :, None, :], -1, 0))
+        # remove the cluster we are comparing from the equation, as well as any clusters that are gone
+        distance[:, np.eye(size[1], dtype=bool)] = np.inf
+        distance[np.isnan(distance)] = np.inf
+        return _round_hundredths(distance.min(axis=2))[trial_id, position]
+
+    min_distance_before = _closest_neighbours(clusters['c_x_before'], clusters['c_y_before'])
+    min_distance_after = _closest_neighbours(clusters['c_x_after'], clusters['c_y_after'])
+
+    # do not calculate a difference for a cluster that is removed (or has no neighbours left) - we just don't count that as a seperation+ or -
+    compared = ~gone & np.isfinite(min_distance_before) & np.isfinite(min_distance_after)
+    clusters['sep+'] = compared & (min_distance_before < min_distance_after)
+    clusters['sep-'] = compared & (min_distance_before > min_distance_after)
+
+    # if it occurered more than once in any group, just pen down 1 (thus the max of all of these become 80)
+    clusters_change = clusters[['coh-', 'coh+', 'gone', 'sep+', 'sep-']].groupby(trial).any()
+    clusters_change = clusters_change.reindex(trials, fill_value=False)
+
+    # check for combinations of coh and sep
+    coh_dec, coh_inc = clusters_change['coh-'], clusters_change['coh+']
+    sep_dec, sep_inc = clusters_change['sep-'], clusters_change['sep+']
+    clusters_change['coh-only'] = coh_dec & ~coh_inc
+    clusters_change['coh+only'] = ~coh_dec & coh_inc
+    clusters_change['coh-+both'] = coh_dec & coh_inc
+    clusters_change['sep-only'] = sep_dec & ~sep_inc
+    clusters_change['sep+only'] = ~sep_dec & sep_inc
+    clusters_change['sep-+both'] = sep_dec & sep_inc
+    clusters_change['coh+&sep+'] = coh_inc & sep_inc
+    clusters_change['coh+&no_sep+'] = coh_inc & ~sep_inc
+    clusters_change['sep+&no_coh+'] = ~coh_inc & sep_inc
+    clusters_change = clusters_change.astype('int64')
 
-    # columns look like: ['participant','physicalisation','orientation','condition','cube', 'h', 'o', 'g', 'x', 'y']
+    per_participant = clusters_change.groupby(['physicalisation', 'participant']).sum()
+    per_phys = clusters_change.groupby(['physicalisation']).sum()
 
-    # convert to numbers where possible
-    print(frame.info())
+    # add a total row
+    per_phys.loc["total"] = per_phys.sum(axis=0)
 
-    # reset index, we need a different angle, we want to check the cubes, per condition,
-    frame.reset_index(inplace=True)
-    frame.set_index(['physicalisation', 'participant', 'orientation', 'g', 'condition', 'cube'], inplace=True)
+    # add confidence intervals, by resampling the participants
+    if bootstrap:
+        per_phys = _bootstrap(per_participant, per_phys, bootstrap, seed, jobs)
 
-    # per trial...
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None):  # more options can be specified also
+        print(per_participant)
 
-    # if specific, change query here
-    # conditions = frame.query('physicalisation == 5 and participant == 4 and orientation == "N"').groupby(['physicalisation', 'participant', 'orientation'])
-    conditions = frame.groupby(['physicalisation', 'participant', 'orientation'])
-    clusters_change = conditions.progress_apply(_centroids_distances)
+    # save
+    _save_csv(per_participant, f"cluster_coh&sep_per_participant_{name}.csv")
+    _save_csv(per_phys, f"cluster_coh&sep_{name}.csv")
 
-    # with pd.option_context('display.max_rows', None, 'display.max_columns', None):  # more options can be specified also
-         # print(clusters_change)
+    # test the differences between phases and physicalisations, and save the p-values next to the results
+    if permutations:
+        p_values = _permutation_tests(per_participant, permutations, seed)
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None):
+            print(p_values)
+        _save_csv(p_values, f"cluster_coh&sep_{name}_pvalues.csv")
 
-    per_participant = clusters_change.groupby(['physicalisation', 'participant']).sum()
-    per_phys = clusters_change.groupby(['physicalisation']).sum()
+    return per_phys
 
-    # add a total row
-    per_phys.loc["total"] = per_phys.sum(axis=0)
+
+def _cluster_scores(g: np.ndarray, x: np.ndarray, y: np.ndarray) -> tuple:
+    """Calculates the Davies-Bouldin index and the silhouette score of a batch of trial conditions at once
+    Args:
+        g, x, y: (trial condition, cube) arrays of the cluster and position of each cube, NaN for cubes without a cluster
+    Returns:
+        A tuple of (trial condition) arrays of the Davies-Bouldin index and the silhouette score,
+        NaN where these are not defined (i.e. with fewer than 2 clusters, or only clusters of a single cube)
+    """
+    valid = ~(np.isnan(g) | np.isnan(x) | np.isnan(y))
+    labels = np.unique(g[valid])
+    # (trial condition, cube, cluster) of which cluster each cube belongs to
+    member = valid[:, :, None] & (g[:, :, None] == labels)
+    weights = member.astype(float)
+    counts = weights.sum(axis=1)
+    clusters = np.count_nonzero(counts, axis=1)
+    samples = np.count_nonzero(valid, axis=1)
+    points = np.stack([np.where(valid, x, 0), np.where(valid, y, 0)], axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Davies-Bouldin: the mean over clusters of the highest (scatter + scatter) / distance to another cluster
+        centroids = np.einsum('tkl,tkd->tld', weights, points) / counts[:, :, None]
+        to_centroid = np.hypot(*np.moveaxis(points[:, :, None, :] - centroids[:, None, :, :], -1, 0))
+        scatter = np.where(member, to_centroid, 0).sum(axis=1) / counts
+        between = np.hypot(*np.moveaxis(centroids[:, :, None, :] - centroids[:, None, :, :], -1, 0))
+        # like scikit-learn, centroids in the same place (incl. a cluster with itself) do not count as similar
+        between[between == 0] = np.inf
+        similarity = (scatter[:, :, None] + scatter[:, None, :]) / between
+        similarity[np.isnan(similarity)] = -np.inf
+        highest = np.where(counts > 0, similarity.max(axis=2), 0)
+        davies_bouldin = highest.sum(axis=1) / clusters
+
+        # silhouette: per cube, the mean distance to its own cluster (a) and to the closest other cluster (b)
+        distance = np.hypot(*np.moveaxis(points[:, :, None, :] - points[:, None, :, :], -1, 0))
+        summed = np.einsum('tij,tjl->til', distance, weights)
+        own = (counts[:, None, :] * member).sum(axis=2)
+        a = (summed * member).sum(axis=2) / (own - 1)
+        others = np.where(member | (counts[:, None, :] == 0), np.inf, summed / counts[:, None, :])
+        b = others.min(axis=2)
+        widths = np.nan_to_num((b - a) / np.maximum(a, b))
+        # a cube alone in its cluster scores 0
+        widths = np.where(valid & (own > 1), widths, 0)
+        silhouette = widths.sum(axis=1) / samples
+
+    davies_bouldin[clusters < 2] = np.nan
+    silhouette[(clusters < 2) | (clusters >= samples)] = np.nan
+    return davies_bouldin, silhouette
+
+
+@profiling.profiled()
+def _cluster_quality(frame: pd.DataFrame, batch: int = 4096) -> pd.DataFrame:
+    """Calculates the Davies-Bouldin index and the silhouette score of the clusters (g) in every trial and condition
+    Args:
+        frame: the data frame as loaded by helpers.get_large_csv(), or a Dataset of it
+        batch: the number of trial conditions of which the pairwise distances are calculated at once
+    Returns:
+        A dataframe indexed by (physicalisation, participant, orientation, condition), with a 'davies_bouldin' and 'silhouette' column
+    """
+    dataset = frame if isinstance(frame, Dataset) else Dataset.from_frame(frame)
+    cubes = dataset.shape[-1]
+    recorded = dataset.present.any(axis=-1).ravel()
+    g, x, y = (getattr(dataset, column).reshape(-1, cubes)[recorded] for column in ['g', 'x', 'y'])
+
+    scores = np.full((len(g), 2), np.nan)
+    for start in range(0, len(g), batch):
+        chunk = slice(start, start + batch)
+        scores[chunk] = np.column_stack(_cluster_scores(g[chunk], x[chunk], y[chunk]))
+
+    names = Dataset.axes[:4]
+    index = pd.MultiIndex.from_product([dataset.levels[axis] for axis in names], names=names)[recorded]
+    return pd.DataFrame(scores, index=index, columns=pd.Index(['davies_bouldin', 'silhouette'], name='type'))
+
+
+@profiling.profiled()
+def cluster_quality(frame: pd.DataFrame, bootstrap: int = 0, seed: int = 0, jobs: int = 1) -> None:
+    """Calculates how the Davies-Bouldin index and silhouette score of the clusters changed in each phase
+    A lower Davies-Bouldin index, or a higher silhouette score, means the clusters are more compact and further apart.
+    See https://en.wikipedia.org/wiki/Davies%E2%80%93Bouldin_index and https://en.wikipedia.org/wiki/Silhouette_(clustering)
+    Args:
+        frame: the data frame storing data to be rendered, or a Dataset of it
+        bootstrap: the number of times participants are resampled, to add 95% confidence intervals to the results per physicalisation (0 adds none)
+        seed: the seed of the resampling
+        jobs: the number of processes resampling in parallel, defaults to 1
+    Returns:
+        the mean change per physicalisation, of the mean change of each of its participants
+    """
+    quality = _cluster_quality(frame)
+    wide = quality.unstack('condition')
+
+    # the change in each phase, per trial (NaN if either condition has no score)
+    changes = pd.DataFrame({(column, phase): wide[(column, a)] - wide[(column, b)]
+                            for column in quality.columns for phase, (b, a) in phases.items()})
+    changes.columns.names = ['type', 'phase']
+
+    # calculate the mean change of the trials of each participant, and the mean of the participants, as resampled by _bootstrap()
+    per_participant = changes.groupby(['physicalisation', 'participant']).mean()
+    per_phys = per_participant.groupby(['physicalisation']).mean()
+
+    # add a total row, of all participants
+    per_phys.loc["total"] = per_participant.mean(axis=0)
+
+    # add confidence intervals, by resampling the participants
+    if bootstrap:
+        per_phys = _bootstrap(per_participant, per_phys, bootstrap, seed, jobs, means=per_participant.columns)
+
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None):  # more options can be specified also
+        print(per_participant)
+
+    # save
+    _save_csv(quality, f"cluster_quality_per_trial.csv")
+    _save_csv(per_participant, f"cluster_quality_per_participant.csv")
+    _save_csv(per_phys, f"cluster_quality.csv")
+
+    return per_phys
+
+
+def _neighbourhoods(x: np.ndarray, y: np.ndarray, k: int) -> np.ndarray:
+    """Finds the k nearest neighbours of every cube, for a batch of trials and conditions at once
+    As cubes are placed on a grid, many are equally far apart: every cube as close as the k-th nearest neighbour is included
+    Args:
+        x, y: (trial, condition, cube) arrays of the position of each cube, NaN for missing cubes
+        k: the number of neighbours
+    Returns:
+        A boolean (trial, condition, cube, cube) array, True where the latter cube is a neighbour of the former
+    """
+    cubes = x.shape[-1]
+    distance = np.hypot(x[..., :, None] - x[..., None, :], y[..., :, None] - y[..., None, :])
+    # a cube is not its own neighbour, and missing cubes are no one's neighbour
+    distance[..., np.eye(cubes, dtype=bool)] = np.inf
+    distance[np.isnan(distance)] = np.inf
+    radius = np.partition(distance, min(k, cubes) - 1, axis=-1)[..., min(k, cubes) - 1]
+    return (distance <= radius[..., None]) & np.isfinite(distance)
+
+
+@profiling.profiled()
+def _neighbourhood_overlap(frame: pd.DataFrame, k: int = 3, batch: int = 1024) -> pd.DataFrame:
+    """Calculates how much the k nearest neighbours of each cube stayed the same in each phase
+    Args:
+        frame: the data frame as loaded by helpers.get_large_csv(), or a Dataset of it
+        k: the number of neighbours
+        batch: the number of trials of which the distances are calculated at once
+    Returns:
+        A dataframe indexed per cube in each trial, with a column per phase of the overlap (the Jaccard index) of
+        its neighbours before and after, NaN if the cube is missing in either condition
+    """
+    dataset = frame if isinstance(frame, Dataset) else Dataset.from_frame(frame)
+    conditions, cubes = dataset.shape[-2:]
+    recorded = dataset.present.any(axis=(3, 4)).ravel()
+    x, y = (getattr(dataset, column).reshape(-1, conditions, cubes)[recorded] for column in ['x', 'y'])
+    position = {condition: dataset.levels['condition'].get_loc(condition) for phase in phases.values() for condition in phase}
+
+    overlap = np.full((len(x), cubes, len(phases)), np.nan)
+    for start in range(0, len(x), batch):
+        chunk = slice(start, start + batch)
+        neighbours = _neighbourhoods(x[chunk], y[chunk], k)
+        placed = ~(np.isnan(x[chunk]) | np.isnan(y[chunk]))
+        for i, (b, a) in enumerate(phases.values()):
+            before, after = neighbours[:, position[b]], neighbours[:, position[a]]
+            with np.errstate(invalid='ignore'):
+                jaccard = (before & after).sum(axis=-1) / (before | after).sum(axis=-1)
+            overlap[chunk, :, i] = np.where(placed[:, position[b]] & placed[:, position[a]], jaccard, np.nan)
+
+    names = ['physicalisation', 'participant', 'orientation', 'cube']
+    index = pd.MultiIndex.from_product([dataset.levels[axis] for axis in names], names=names)
+    index = index[np.repeat(recorded, cubes)]
+    return pd.DataFrame(overlap.reshape(-1, len(phases)), index=index, columns=pd.Index(list(phases), name='phase'))
+
+
+@profiling.profiled()
+def neighbourhood_changes(frame: pd.DataFrame, k: int = 3, bootstrap: int = 0, seed: int = 0, jobs: int = 1) -> None:
+    """Calculates whether the k nearest neighbours of each cube stayed the same in each phase
+    'overlap' is the mean share of neighbours a cube kept (1 if all stayed the same), 'changed' the number of cubes
+    of which any neighbour changed
+    Args:
+        frame: the data frame storing data to be rendered, or a Dataset of it
+        k: the number of neighbours
+        bootstrap: the number of times participants are resampled, to add 95% confidence intervals to the results per physicalisation (0 adds none)
+        seed: the seed of the resampling
+        jobs: the number of processes resampling in parallel, defaults to 1
+    Returns:
+        the changes per physicalisation
+    """
+    trial = ['physicalisation', 'participant', 'orientation']
+
+    overlap = _neighbourhood_overlap(frame, k)
+    changed = (overlap < 1).astype('int64')
+
+    # the mean overlap of the cubes in each trial, and the number of cubes of which the neighbours changed
+    per_trial = pd.concat({'overlap': overlap.groupby(trial).mean(), 'changed': changed.groupby(trial).sum()}, axis=1, names=['type'])
+
+    # average the overlap, and sum the changes, where the overlap per physicalisation is the mean of its participants, as resampled by _bootstrap()
+    per_participant = per_trial.groupby(['physicalisation', 'participant']).agg({column: 'mean' if column[0] == 'overlap' else 'sum' for column in per_trial.columns})
+    per_phys = per_participant.groupby(['physicalisation']).agg({column: 'mean' if column[0] == 'overlap' else 'sum' for column in per_trial.columns})
+
+    # add a total row, of all participants
+    per_phys.loc["total"] = pd.concat([per_participant['overlap'].mean(axis=0), per_phys['changed'].sum(axis=0)], keys=['overlap', 'changed'])
+    per_phys['changed'] = per_phys['changed'].astype('int64')
+
+    # add confidence intervals, by resampling the participants
+    if bootstrap:
+        per_phys = _bootstrap(per_participant, per_phys, bootstrap, seed, jobs, means=per_participant[['overlap']].columns)
 
     with pd.option_context('display.max_rows', None, 'display.max_columns', None):  # more options can be specified also
         print(per_participant)
 
     # save
-    per_participant.to_csv(path_or_buf=helpers.create_output_folder('output') / f"cluster_coh&sep_per_participant_{name}.csv", sep=';', header=True)
-    per_phys.to_csv(path_or_buf=helpers.create_output_folder('output') / f"cluster_coh&sep_{name}.csv", sep=';', header=True)
+    _save_csv(per_participant, f"neighbours_changed_per_participant_k{k}.csv")
+    _save_csv(per_phys, f"neighbours_changed_k{k}.csv")
 
     return per_phys
@@ -0,0 +1,136 @@
+"""Records the wall time, number of calls and peak memory of named stages, e.g.
+
+    with profiling.stage('load csv'):
+        ...
+
+    @profiling.profiled('calc')
+    def calculation(frame): ...
+
+Nothing is recorded (and hardly any time is spent) unless profiling is enabled, see enable() and profiled()
+"""
+from contextlib import contextmanager
+from pathlib import Path
+import cProfile
+import functools
+import json
+import time
+import tracemalloc
+
+_enabled = False
+# per stage name: the number of calls, seconds spent and the peak memory traced while it ran
+_stages = {}
+# the highest peak memory seen so far in each stage that is running, outermost first
+_running = []
+
+
+class stage:
+    """Records the time and peak memory spent in a block of code, under a name"""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        if _enabled:
+            if tracemalloc.is_tracing():
+                _, peak = tracemalloc.get_traced_memory()
+                if _running:
+                    _running[-1] = max(_running[-1], peak)
+                if hasattr(tracemalloc, 'reset_peak'):
+                    tracemalloc.reset_peak()
+            _running.append(0)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if _enabled and _running:
+            seconds = time.perf_counter() - self.start
+            peak = _running.pop()
+            if tracemalloc.is_tracing():
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                # the stage this one ran in peaked at least as high
+                if _running:
+                    _running[-1] = max(_running[-1], peak)
+
+            record = _stages.setdefault(self.name, {'calls': 0, 'seconds': 0.0, 'peak': 0})
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['peak'] = max(record['peak'], peak)
+        return False
+
+
+def profiled(name: str = None):
+    """Decorates a function, to record each call of it as a stage (by default, named after the function)"""
+    def decorator(function):
+        label = name if name is not None else function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with stage(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable(memory: bool = True) -> None:
+    """Starts recording stages, from scratch
+    Args:
+        memory: if true, also traces the peak memory of each stage (which slows down allocations)
+    """
+    global _enabled
+    _stages.clear()
+    _running.clear()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+
+def disable() -> dict:
+    """Stops recording stages
+    Returns:
+        The recorded stages, as a dictionary of name: {'calls', 'seconds', 'peak'}
+    """
+    global _enabled
+    _enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return dict(_stages)
+
+
+def summary(stages: dict) -> str:
+    """A table of the recorded stages, slowest first"""
+    lines = [f"{'stage':<40} {'calls':>7} {'seconds':>10} {'peak MB':>10}"]
+    for name, record in sorted(stages.items(), key=lambda item: -item[1]['seconds']):
+        lines.append(f"{name:<40} {record['calls']:>7} {record['seconds']:>10.3f} {record['peak'] / 1e6:>10.1f}")
+    return "\n".join(lines)
+
+
+@contextmanager
+def profile(output: str = None):
+    """Records all stages in a block of code, and prints a summary table afterwards
+    Args:
+        output: optionally, a file to save the profile to; a .prof file saves a cProfile of all
+            function calls (e.g. for snakeviz), any other file saves the recorded stages as .json
+    """
+    profiler = cProfile.Profile() if output is not None and Path(output).suffix == '.prof' else None
+
+    enable(memory=True)
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        stages = disable()
+
+        print("\n" + summary(stages))
+        if profiler is not None:
+            profiler.dump_stats(output)
+            print(f"Saved the cProfile to {output}")
+        elif output is not None:
+            Path(output).write_text(json.dumps(stages, indent=2))
+            print(f"Saved the profile to {output}")
@@ -0,0 +1,140 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import functools
+import json
+import webbrowser
+
+from . import interactions
+from .dataset import Dataset
+
+
+# the page switching between trials: plotly.js is loaded once (and cached by the browser), after which
+# each trial is fetched as the JSON of its figure, and drawn in the same plot
+page = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>physvis</title>
+<script src="/plotly.min.js"></script>
+<style>
+  body { font-family: sans-serif; margin: 0; }
+  form { padding: .5em 1em; background: #eee; }
+  label { margin-right: 1em; }
+  #plot { width: 100vw; height: calc(100vh - 3em); }
+  #error { color: darkred; margin-left: 1em; }
+</style>
+</head>
+<body>
+<form id="trial"><span id="error"></span></form>
+<div id="plot"></div>
+<script>
+const levels = __LEVELS__;
+const names = {physicalisation: 'Physicalisation', participant: 'Participant', orientation: 'Orientation', condition: 'Condition'};
+const form = document.getElementById('trial');
+
+for (const [level, values] of Object.entries(levels)) {
+  const label = document.createElement('label');
+  label.textContent = names[level] + ' ';
+  const select = document.createElement('select');
+  select.name = level;
+  for (const value of values) {
+    select.add(new Option(value, value));
+  }
+  select.addEventListener('change', show);
+  label.appendChild(select);
+  form.insertBefore(label, document.getElementById('error'));
+}
+
+async function show() {
+  const query = new URLSearchParams(new FormData(form));
+  const response = await fetch('/figure?' + query);
+  const result = await response.json();
+  document.getElementById('error').textContent = response.ok ? '' : result.error;
+  if (response.ok) {
+    Plotly.react('plot', result.data, result.layout);
+  }
+}
+
+show();
+</script>
+</body>
+</html>
+"""
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serves the page, plotly.js and the figures of a Dataset, see serve()"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/':
+            self._send(self.server.page, 'text/html; charset=utf-8')
+        elif url.path == '/plotly.min.js':
+            self._send(self.server.plotlyjs(), 'application/javascript', cache=True)
+        elif url.path == '/figure':
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            try:
+                self._send(self.server.figure(query['physicalisation'], query['participant'], query['orientation'], query['condition']), 'application/json')
+            except (KeyError, ValueError) as e:
+                self._send(json.dumps({'error': f"No such trial: {e}"}).encode(), 'application/json', status=404)
+        else:
+            self.send_error(404)
+
+    def _send(self, body: bytes, content_type: str, status: int = 200, cache: bool = False):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if cache:
+            self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep the console quiet while browsing
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    """A local HTTP server holding one Dataset in memory, and the JSON of each figure once it was drawn"""
+
+    daemon_threads = True
+
+    def __init__(self, dataset: Dataset, address: tuple, cache_size: int = 1024):
+        super().__init__(address, Handler)
+        self.dataset = dataset
+        levels = {axis: [str(value) for value in dataset.levels[axis]] for axis in Dataset.axes[:4]}
+        self.page = page.replace('__LEVELS__', json.dumps(levels)).encode()
+        self.figure = functools.lru_cache(maxsize=cache_size)(self._figure)
+        self._plotlyjs = None
+
+    def plotlyjs(self) -> bytes:
+        if self._plotlyjs is None:
+            from plotly.offline import get_plotlyjs
+            self._plotlyjs = get_plotlyjs().encode()
+        return self._plotlyjs
+
+    def _figure(self, physicalisation: str, participant: str, orientation: str, condition: str) -> bytes:
+        import plotly.io
+
+        fig, _ = interactions.display_figure(self.dataset, participant, condition, orientation, physicalisation)
+        return plotly.io.to_json(fig).encode()
+
+
+def serve(dataset: Dataset, host: str = '127.0.0.1', port: int = 8050, browser: bool = True) -> None:
+    """Serves a page to browse the 3D renderings of all trials, until interrupted (control+c)
+    Args:
+        dataset: the trials to show
+        host, port: the address to serve the page on, by default only to this computer
+        browser: if true, opens the page in the browser
+    Returns:
+        nothing
+    """
+    with Server(dataset, (host, port)) as server:
+        url = f"http://{host}:{server.server_address[1]}/"
+        print(f"Serving the visualisations on {url} (press 'control+c' to stop)")
+        if browser:
+            webbrowser.open(url)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
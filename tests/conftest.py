@@ -0,0 +1,51 @@
+"""A small synthetic study (see benchmarks/synthetic.py), collected once for all tests
+
+tests/golden holds the results of the original calculations on the same study, which the tests compare to
+"""
+from pathlib import Path
+import os
+import sys
+
+import pytest
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root / 'src'))
+sys.path.insert(0, str(root / 'benchmarks'))
+
+from physvis import helpers, interactions
+from physvis.dataset import Dataset
+from synthetic import generate_study
+
+golden = Path(__file__).parent / 'golden'
+
+
+@pytest.fixture(scope='session')
+def study(tmp_path_factory) -> Path:
+    """The folder of the study, with its trial files in 'input' and output/combined.csv collected from these"""
+    folder = tmp_path_factory.mktemp('study')
+    generate_study(folder / 'input', participants=3, physicalisations=2)
+
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        interactions.generate_large_csv('input', 'output', save=True, incremental=False)
+    finally:
+        os.chdir(cwd)
+    return folder
+
+
+@pytest.fixture(scope='session')
+def frame(study):
+    return helpers.get_large_csv(str(study / 'output' / 'combined.csv'), cache=False)
+
+
+@pytest.fixture(scope='session')
+def dataset(frame) -> Dataset:
+    return Dataset.from_frame(frame)
+
+
+@pytest.fixture
+def output(tmp_path, monkeypatch) -> Path:
+    """The folder the calculations save their results in, i.e. 'output' in the working directory"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / 'output'
@@ -0,0 +1,12 @@
+"""Checks collect() on the synthetic study of conftest.py"""
+from conftest import golden
+from physvis import interactions
+
+
+def test_combined_csv_same_as_golden(study):
+    assert (study / 'output' / 'combined.csv').read_bytes() == (golden / 'combined.csv').read_bytes()
+
+
+def test_streaming_same_as_golden(study, output):
+    interactions.generate_large_csv(str(study / 'input'), str(output), save=True, chunk_size=10)
+    assert (output / 'combined.csv').read_bytes() == (golden / 'combined.csv').read_bytes()
@@ -0,0 +1,173 @@
+"""Checks the calculations on the synthetic study of conftest.py"""
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import golden
+from physvis import maths
+
+# the files each calculation saves, which should be the same as those of the original calculations
+saved = {
+    'total_cubes_moved': ['amount_cubes_changed__with_type_per_participant_summed.csv', 'amount_cubes_changed_with_type_summed.csv'],
+    'atomic_orientation_moved_summed': ['atomic_orientation_changed_per_participant_summed.csv', 'atomic_orientation_changed_summed.csv'],
+    'proximity_changes': ['cluster_coh&sep_per_participant_phase2.csv', 'cluster_coh&sep_phase2.csv'],
+}
+
+
+@pytest.mark.parametrize('data', ['frame', 'dataset'])
+@pytest.mark.parametrize('name', list(saved))
+def test_same_as_golden(name, data, output, request):
+    getattr(maths, name)(request.getfixturevalue(data))
+    for filename in saved[name]:
+        assert (output / filename).read_bytes() == (golden / filename).read_bytes(), filename
+
+
+def _davies_bouldin(g, points):
+    # the Davies-Bouldin index of one trial condition, by its definition
+    labels = sorted(set(g))
+    if len(labels) < 2:
+        return np.nan
+    members = [points[g == label] for label in labels]
+    centroids = [cluster.mean(axis=0) for cluster in members]
+    scatter = [np.mean([np.linalg.norm(point - centroid) for point in cluster]) for cluster, centroid in zip(members, centroids)]
+    highest = []
+    for i in range(len(labels)):
+        ratios = []
+        for j in range(len(labels)):
+            distance = np.linalg.norm(centroids[i] - centroids[j])
+            # clusters with the same centroid do not count as similar
+            if j != i:
+                ratios.append((scatter[i] + scatter[j]) / distance if distance > 0 else 0)
+        highest.append(max(ratios))
+    return np.mean(highest)
+
+
+def _silhouette(g, points):
+    # the silhouette score of one trial condition, by its definition
+    labels = set(g)
+    if not 2 <= len(labels) <= len(g) - 1:
+        return np.nan
+    widths = []
+    for i, point in enumerate(points):
+        own = [np.linalg.norm(point - points[j]) for j in range(len(g)) if g[j] == g[i] and j != i]
+        if not own:
+            widths.append(0)
+            continue
+        a = np.mean(own)
+        b = min(np.mean([np.linalg.norm(point - other) for other in points[g == label]]) for label in labels if label != g[i])
+        widths.append((b - a) / max(a, b) if max(a, b) > 0 else 0)
+    return np.mean(widths)
+
+
+def test_cluster_scores_by_definition():
+    rng = np.random.default_rng(0)
+    cases = [(rng.integers(1, clusters + 1, cubes).astype(float), rng.integers(1, 21, (cubes, 2)).astype(float))
+             for cubes, clusters in [(16, 5), (16, 2), (8, 8), (6, 1), (5, 3), (3, 2)] for _ in range(5)]
+    g, x, y = (np.full((len(cases), 16), np.nan) for _ in range(3))
+    for row, (labels, points) in enumerate(cases):
+        g[row, :len(labels)], x[row, :len(labels)], y[row, :len(labels)] = labels, points[:, 0], points[:, 1]
+
+    davies_bouldin, silhouette = maths._cluster_scores(g, x, y)
+    np.testing.assert_allclose(davies_bouldin, [_davies_bouldin(*case) for case in cases])
+    np.testing.assert_allclose(silhouette, [_silhouette(*case) for case in cases])
+
+
+def test_cluster_quality_of_every_trial(frame, dataset):
+    quality = maths._cluster_quality(dataset)
+    assert len(quality) == frame.groupby(['physicalisation', 'participant', 'orientation', 'condition']).ngroups
+    for trial, cubes in frame.groupby(quality.index.names):
+        cubes = cubes.dropna(subset=['g', 'x', 'y'])
+        g, points = cubes['g'].to_numpy(dtype=float), cubes[['x', 'y']].to_numpy(dtype=float)
+        assert quality.loc[trial, 'davies_bouldin'] == pytest.approx(_davies_bouldin(g, points), nan_ok=True)
+        assert quality.loc[trial, 'silhouette'] == pytest.approx(_silhouette(g, points), nan_ok=True)
+
+
+def _neighbours(positions: dict, cube, k: int) -> set:
+    # the other cubes as close as the k-th nearest to the cube, by its definition (with equally far cubes included)
+    distances = {other: np.hypot(*np.subtract(position, positions[cube])) for other, position in positions.items() if other != cube}
+    if not distances:
+        return set()
+    radius = sorted(distances.values())[min(k, len(distances)) - 1]
+    return {other for other, distance in distances.items() if distance <= radius}
+
+
+def test_neighbourhoods_include_ties():
+    # a square, with one cube further away
+    x, y = np.array([[[0, 1, 0, 1, 5]]], dtype=float), np.array([[[0, 0, 1, 1, 5]]], dtype=float)
+    neighbours = maths._neighbourhoods(x, y, k=1)[0, 0]
+    assert neighbours[0].tolist() == [False, True, True, False, False]
+    assert neighbours[4].tolist() == [False, False, False, True, False]
+
+
+@pytest.mark.parametrize('k', [1, 3])
+def test_neighbourhood_overlap_by_definition(frame, dataset, k):
+    overlap = maths._neighbourhood_overlap(dataset, k)
+    for trial, rows in frame.dropna(subset=['x', 'y']).groupby(['physicalisation', 'participant', 'orientation']):
+        positions = {condition: {cube: (x, y) for (cube, x, y) in cubes.reset_index()[['cube', 'x', 'y']].itertuples(index=False)}
+                     for condition, cubes in rows.groupby('condition')}
+        for cube, row in overlap.loc[trial].iterrows():
+            for phase, (before, after) in maths.phases.items():
+                if cube in positions.get(before, {}) and cube in positions.get(after, {}):
+                    a, b = _neighbours(positions[before], cube, k), _neighbours(positions[after], cube, k)
+                    expected = len(a & b) / len(a | b) if a | b else np.nan
+                else:
+                    expected = np.nan
+                assert row[phase] == pytest.approx(expected, nan_ok=True), (trial, cube, phase)
+
+
+@pytest.mark.parametrize('name', ['total_cubes_moved', 'proximity_changes', 'cluster_quality', 'neighbourhood_changes'])
+def test_bootstrap_same_for_any_jobs(dataset, output, name):
+    # more resamples than in one chunk, so these are spread over the processes
+    one, two = (getattr(maths, name)(dataset, bootstrap=2500, seed=1, jobs=jobs) for jobs in (1, 2))
+    pd.testing.assert_frame_equal(one, two)
+
+    # each result lies within its own interval
+    def _bound(column, bound):
+        return column[:-1] + (f"{column[-1]} {bound}",) if isinstance(column, tuple) else f"{column} {bound}"
+
+    bounds = {_bound(column, bound) for column in one.columns for bound in ('2.5%', '97.5%')}
+    for column in [column for column in one.columns if column not in bounds]:
+        lower, upper = (one[_bound(column, bound)] for bound in ('2.5%', '97.5%'))
+        inside = one[column].isna() | ((lower <= one[column] + 1e-9) & (one[column] <= upper + 1e-9))
+        assert inside.all(), column
+
+
+@pytest.mark.parametrize('name', list(saved))
+def test_p_values_same_for_any_jobs(dataset, output, name):
+    p_values = []
+    for jobs in (1, 2, 1):
+        getattr(maths, name)(dataset, permutations=2500, seed=1, jobs=jobs)
+        p_values.append((output / saved[name][-1].replace('.csv', '_pvalues.csv')).read_bytes())
+        # the p-values are saved apart, so the results stay as they were
+        for filename in saved[name]:
+            assert (output / filename).read_bytes() == (golden / filename).read_bytes(), filename
+    assert p_values[0] == p_values[1] == p_values[2]
+
+
+def test_p_values_by_enumeration():
+    # 8 participants, of 2 physicalisations, where the first phase of physicalisation 1 changed more
+    rng = np.random.default_rng(3)
+    index = pd.MultiIndex.from_product([[1, 2], range(1, 9)], names=['physicalisation', 'participant'])
+    columns = pd.MultiIndex.from_product([['total'], ['0-1', '0-2', '1-2']], names=['type', 'phase'])
+    per_participant = pd.DataFrame(rng.integers(0, 10, (16, 3)), index=index, columns=columns)
+    per_participant.iloc[:8, 0] += 4
+    p_values = maths._permutation_tests(per_participant, 20000, seed=1)
+
+    # phases: all 2^8 ways of swapping the phases of participants
+    signs = np.array(list(itertools.product([-1, 1], repeat=8)))
+    for physicalisation in [1, 2, 'total']:
+        rows = per_participant['total'] if physicalisation == 'total' else per_participant.loc[physicalisation, 'total']
+        rows = rows.groupby('participant').sum()
+        for before, after in itertools.combinations(['0-1', '0-2', '1-2'], 2):
+            difference = (rows[after] - rows[before]).to_numpy()
+            exact = np.mean(np.abs(signs @ difference) >= abs(difference.sum()))
+            assert p_values.loc[physicalisation, ('total', f"p {before} vs {after}")] == pytest.approx(exact, abs=.02)
+
+    # physicalisations: all 2^8 ways of swapping the physicalisations of participants
+    for phase in ['0-1', '0-2', '1-2']:
+        values = per_participant[('total', phase)].unstack('physicalisation').to_numpy()
+        shuffled = np.where(signs[:, :, None] > 0, values, values[:, ::-1])
+        exact = np.mean((shuffled.sum(axis=1) ** 2).sum(axis=1) >= (values.sum(axis=0) ** 2).sum())
+        assert p_values.loc['p physicalisation', ('total', phase)] == pytest.approx(exact, abs=.02)
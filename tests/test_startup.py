@@ -0,0 +1,25 @@
+"""Checks that the phys command starts within a time budget, without importing pandas, numpy or plotly
+
+The budget (in seconds) can be changed for slower machines with the PHYSVIS_STARTUP_BUDGET environment variable
+"""
+from pathlib import Path
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'benchmarks'))
+
+from startup import commands, imported_heavy_modules, startup_time
+
+budget = float(os.environ.get('PHYSVIS_STARTUP_BUDGET', .3))
+
+
+def test_no_heavy_imports():
+    assert imported_heavy_modules() == []
+
+
+@pytest.mark.parametrize('args', commands, ids=[' '.join(args) for args in commands])
+def test_startup_time(args):
+    seconds = startup_time(args, repeat=3)
+    assert seconds <= budget, f"phys {' '.join(args)} took {seconds:.3f}s to start, over the budget of {budget}s"